@@ -0,0 +1,108 @@
+import numpy as np
+
+from category_encoder import CategoryEncoder
+
+
+class AggregateCube:
+    # Axes of the cube, in this order, and the measures summed in every cell
+    DIMENSIONS = ['brand', 'model', 'year', 'fuelType']
+    MEASURES = ['price', 'mileage', 'mpg', 'tax', 'engineSize']
+
+    def __init__(self):
+        # One encoder per axis, new categories are appended so existing codes stay valid
+        self.encoders = {dimension: CategoryEncoder([]) for dimension in self.DIMENSIONS}
+
+        # cells[brand, model, year, fuelType] holds the row count, the sum of every measure
+        # and the sum of squares of every measure
+        self.cells = np.zeros((0,) * len(self.DIMENSIONS) + (1 + 2 * len(self.MEASURES),))
+
+        # Sums over the axes a query leaves open, keyed by the queried dimensions and kept up to date
+        self.marginals = {}
+
+    @classmethod
+    def from_frame(cls, df):
+        cube = cls()
+        cube.add_rows(df)
+        return cube
+
+    def extend_dimensions(self, df):
+        # Give unseen categories the next codes and grow the cells along their axis
+        padding = []
+        for dimension in self.DIMENSIONS:
+            encoder = self.encoders[dimension]
+            values = df[dimension]
+            new_values = values[~encoder.known(values)].dropna().unique().tolist()
+            if new_values:
+                self.encoders[dimension] = CategoryEncoder(encoder.classes + new_values)
+            padding.append((0, len(new_values)))
+
+        if any(after for _, after in padding):
+            self.cells = np.pad(self.cells, padding + [(0, 0)])
+            # Cheaper to sum the few queried marginals again than to pad each of them
+            self.marginals = {}
+
+    @staticmethod
+    def accumulate(array, codes, stats):
+        # Add the per-row statistics into the cells addressed by codes, one bincount per statistic
+        if not codes:
+            # The marginal of a query without dimensions is a single cell
+            array += stats.sum(axis=0)
+            return
+        shape = array.shape[:-1]
+        flat_index = np.ravel_multi_index(codes, shape)
+        flat_array = array.reshape(-1, array.shape[-1])
+        for k in range(stats.shape[1]):
+            flat_array[:, k] += np.bincount(flat_index, weights=stats[:, k], minlength=flat_array.shape[0])
+
+    def add_rows(self, df):
+        self.extend_dimensions(df)
+
+        codes = [self.encoders[dimension].codes(df[dimension]) for dimension in self.DIMENSIONS]
+        # Rows with a missing category have no cell
+        complete = np.logical_and.reduce([code >= 0 for code in codes])
+        codes = [code[complete] for code in codes]
+
+        values = df[self.MEASURES].to_numpy(dtype=np.float64)[complete]
+        stats = np.hstack([np.ones((len(values), 1)), values, values * values])
+
+        self.accumulate(self.cells, codes, stats)
+        for dimensions, marginal in self.marginals.items():
+            self.accumulate(marginal, [codes[self.DIMENSIONS.index(dimension)] for dimension in dimensions], stats)
+
+    def marginal(self, dimensions):
+        # The cells summed over every axis that is not in dimensions, computed on the first query.
+        # With every dimension selected nothing is summed, the cells themselves answer
+        if len(dimensions) == len(self.DIMENSIONS):
+            return self.cells
+        if dimensions not in self.marginals:
+            open_axes = tuple(i for i, dimension in enumerate(self.DIMENSIONS) if dimension not in dimensions)
+            self.marginals[dimensions] = self.cells.sum(axis=open_axes)
+        return self.marginals[dimensions]
+
+    def query(self, **selection):
+        # Statistics of the rows matching the selected categories, e.g. query(brand='Audi', year=2017).
+        # Dimensions that are left out or None are rolled up
+        dimensions = tuple(dimension for dimension in self.DIMENSIONS if selection.get(dimension) is not None)
+        codes = []
+        for dimension in dimensions:
+            code = self.encoders[dimension].codes_by_category.get(selection[dimension], -1)
+            if code < 0:
+                return self.cell_stats(np.zeros(self.cells.shape[-1]))
+            codes.append(code)
+        return self.cell_stats(self.marginal(dimensions)[tuple(codes)])
+
+    def cell_stats(self, cell):
+        # Count, means and sample standard deviations from the count, sums and sums of squares
+        count = int(cell[0])
+        n_measures = len(self.MEASURES)
+        stats = {'count': count, 'mean': {}, 'std': {}}
+        for i, measure in enumerate(self.MEASURES):
+            total = cell[1 + i]
+            total_squares = cell[1 + n_measures + i]
+            stats['mean'][measure] = total / count if count else float('nan')
+            if count > 1:
+                variance = max(total_squares - total * total / count, 0.0) / (count - 1)
+                stats['std'][measure] = float(np.sqrt(variance))
+            else:
+                stats['std'][measure] = float('nan')
+        return stats
@@ -0,0 +1,447 @@
+import argparse
+import importlib.util
+import itertools
+import os
+import tempfile
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import mean_absolute_error, r2_score
+
+import text_format
+from aggregate_cube import AggregateCube
+from category_encoder import CategoryEncoder
+from compiled_forest import CompiledForest
+from df_load import DFLoad, PYARROW_AVAILABLE
+from df_predict import DFPredict
+from df_preprocess import DFPreprocess
+from df_train import DFTrain
+from feature_transform import FeatureTransform
+from features import FeatureColumns
+from model_manifest import read_manifest
+from preprocess_cache import PreprocessCache
+from scatter_plot_view import ScatterPlotView
+
+text_format = text_format.TextFormat
+
+
+def optional_number(value):
+    # Command line values for settings where None means unlimited, e.g. --max-depth none 20
+    if value.lower() == 'none':
+        return None
+    return float(value) if '.' in value else int(value)
+
+
+def print_header(title):
+    print(f"\n{text_format.BOLD}{title}{text_format.RESET}\n")
+
+
+def measure_latency(function, repeats):
+    # Time every call separately and return the p50 and p99 latency in milliseconds
+    timings = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter()
+        function()
+        timings[i] = time.perf_counter() - start
+    return np.percentile(timings, 50) * 1000, np.percentile(timings, 99) * 1000
+
+
+def load_feature_matrix(csv_path, model_dir):
+    # Outlier-filtered rows of the dataset, encoded and scaled with the saved transform
+    df = DFPreprocess(DFLoad(csv_path).load()).remove_outliers()
+    feature_transform = FeatureTransform.load_from_dir(model_dir)
+    return feature_transform.transform(df[feature_transform.known_rows(df)])
+
+
+def benchmark_compiled_forest(args):
+    rf_model = joblib.load(f'{args.model_dir}/{DFPredict.MODEL_FILENAME}')
+    compiled_forest = CompiledForest.from_estimators(rf_model.estimators_)
+    x = load_feature_matrix(args.csv, args.model_dir)
+    x_df = pd.DataFrame(x, columns=FeatureColumns.FEATURES)
+
+    print_header('Compiled forest vs sklearn RandomForestRegressor')
+    print(f'Trees: {compiled_forest.n_trees}, nodes: {len(compiled_forest.value)}, '
+          f'max depth: {compiled_forest.max_depth}')
+
+    # Both predictors have to agree before their speed matters
+    max_difference = np.abs(rf_model.predict(x_df) - compiled_forest.predict(x)).max()
+    print(f'Max absolute difference over {len(x)} rows: {max_difference:.3e}')
+
+    print_header('Single-row latency (ms)')
+    row = x[:1]
+    row_df = x_df.iloc[:1]
+    sklearn_p50, sklearn_p99 = measure_latency(lambda: rf_model.predict(row_df), args.repeats)
+    compiled_p50, compiled_p99 = measure_latency(lambda: compiled_forest.predict(row), args.repeats)
+    print(f'{"sklearn":<10} p50 {sklearn_p50:8.3f}   p99 {sklearn_p99:8.3f}')
+    print(f'{"compiled":<10} p50 {compiled_p50:8.3f}   p99 {compiled_p99:8.3f}')
+
+    print_header(f'Batch latency for {args.batch_size} rows (ms)')
+    batch = x[:args.batch_size]
+    batch_df = x_df.iloc[:args.batch_size]
+    repeats = max(args.repeats // 100, 5)
+    sklearn_p50, sklearn_p99 = measure_latency(lambda: rf_model.predict(batch_df), repeats)
+    compiled_p50, compiled_p99 = measure_latency(lambda: compiled_forest.predict(batch), repeats)
+    print(f'{"sklearn":<10} p50 {sklearn_p50:8.3f}   p99 {sklearn_p99:8.3f}')
+    print(f'{"compiled":<10} p50 {compiled_p50:8.3f}   p99 {compiled_p99:8.3f}')
+
+
+def benchmark_training(args):
+    train_df = DFPreprocess(pd.read_csv(args.csv)).preprocess(save=False).dropna()
+
+    results = []
+    settings = itertools.product(args.n_estimators, args.max_depth, args.min_samples_leaf, args.max_samples)
+    for n_estimators, max_depth, min_samples_leaf, max_samples in settings:
+        df_train = DFTrain(train_df)
+        df_train.train_random_forest_regressor(
+            n_estimators=n_estimators,
+            n_jobs=args.n_jobs,
+            max_depth=max_depth,
+            min_samples_leaf=min_samples_leaf,
+            max_samples=max_samples
+        )
+        results.append((n_estimators, max_depth, min_samples_leaf, max_samples, df_train.metrics))
+
+    print_header(f'Random forest training on {len(train_df)} rows, n_jobs={args.n_jobs}')
+    print(f'{"trees":>6} {"depth":>6} {"leaf":>5} {"samples":>8} {"fit s":>8} {"R2":>7} {"MAE":>8} '
+          f'{"MB":>7} {"row ms":>7}')
+    for n_estimators, max_depth, min_samples_leaf, max_samples, metrics in results:
+        print(f'{n_estimators:>6} {str(max_depth):>6} {min_samples_leaf:>5} {str(max_samples):>8} '
+              f'{metrics.fit_seconds:>8.2f} {metrics.r2:>7.4f} {metrics.mae:>8.1f} '
+              f'{metrics.model_bytes / 1024 ** 2:>7.1f} {metrics.single_row_ms:>7.2f}')
+
+
+def benchmark_preprocess_cache(args):
+    df = pd.read_csv(args.csv)
+
+    def preprocess(cache):
+        df_preprocess = DFPreprocess(df)
+        df_preprocess.remove_outliers()
+        if cache is None:
+            return df_preprocess.fit_transform()
+        return df_preprocess.fit_transform_cached(cache, PreprocessCache.key(args.csv, df_preprocess.cache_params()))
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = PreprocessCache(directory)
+        # The first cached call fills the cache, every later one is a hit
+        preprocess(cache)
+
+        print_header(f'Preprocessing {len(df)} rows (ms)')
+        uncached_p50, uncached_p99 = measure_latency(lambda: preprocess(None), args.repeats)
+        cached_p50, cached_p99 = measure_latency(lambda: preprocess(cache), args.repeats)
+        print(f'{"fit":<10} p50 {uncached_p50:8.3f}   p99 {uncached_p99:8.3f}')
+        print(f'{"cached":<10} p50 {cached_p50:8.3f}   p99 {cached_p99:8.3f}')
+
+
+def load_training_frame(csv_path):
+    # Encoded and scaled training rows together with the preprocessor holding the fitted transform
+    df_preprocess = DFPreprocess(DFLoad(csv_path).load())
+    df_preprocess.remove_outliers()
+    train_df = df_preprocess.fit_transform_cached(
+        PreprocessCache(), PreprocessCache.key(csv_path, df_preprocess.cache_params())).dropna()
+    return df_preprocess, train_df
+
+
+def save_and_load(df_train, feature_transform, model_dir, **save_options):
+    # Save into model_dir and load it back the way the GUI and the service do,
+    # returns the predictor, the artifact size in MB and the load time in ms
+    feature_transform.save(f'{model_dir}/{FeatureTransform.FILENAME}')
+    df_train.save_trained_model(model_dir=model_dir, **save_options)
+    artifact_mb = os.path.getsize(f"{model_dir}/{read_manifest(model_dir)['model_file']}") / 1024 ** 2
+
+    start = time.perf_counter()
+    predictor = DFPredict.load(model_dir)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    return predictor, artifact_mb, load_ms
+
+
+def benchmark_backends(args):
+    df_preprocess, train_df = load_training_frame(args.csv)
+
+    # The random forest is listed twice, as the sklearn pickle and as the memory-mapped compiled forest
+    variants = [
+        ('random_forest', 'random_forest', False),
+        ('random_forest compiled', 'random_forest', True),
+        ('hist_gradient_boosting', 'hist_gradient_boosting', False)
+    ]
+    results = []
+    for name, backend, mmap_friendly in variants:
+        df_train = DFTrain(train_df)
+        df_train.train_model(backend)
+
+        with tempfile.TemporaryDirectory() as model_dir:
+            predictor, artifact_mb, load_ms = save_and_load(
+                df_train, df_preprocess.feature_transform, model_dir, mmap_friendly=mmap_friendly)
+
+            x = df_train.x_test.to_numpy()
+            single_p50, _ = measure_latency(lambda: predictor.predict_matrix(x[:1]), args.repeats)
+            batch_p50, _ = measure_latency(lambda: predictor.predict_matrix(x[:args.batch_size]),
+                                           max(args.repeats // 100, 5))
+
+        results.append((name, df_train.metrics, artifact_mb, load_ms, single_p50, batch_p50))
+
+    print_header(f'Estimator backends on {args.csv}, {len(train_df)} rows')
+    print(f'{"backend":<24} {"fit s":>7} {"MB":>7} {"load ms":>8} {"row ms":>7} '
+          f'{f"{args.batch_size} rows ms":>14} {"R2":>7} {"MAE":>8}')
+    for name, metrics, artifact_mb, load_ms, single_p50, batch_p50 in results:
+        print(f'{name:<24} {metrics.fit_seconds:>7.2f} {artifact_mb:>7.1f} {load_ms:>8.1f} {single_p50:>7.3f} '
+              f'{batch_p50:>14.3f} {metrics.r2:>7.4f} {metrics.mae:>8.1f}')
+
+
+def benchmark_compact_artifacts(args):
+    df_preprocess, train_df = load_training_frame(args.csv)
+
+    df_train = DFTrain(train_df)
+    df_train.train_random_forest_regressor(n_estimators=args.n_estimators)
+
+    # Depth and leaf-size caps are applied while training, so they get their own forest
+    capped_train = DFTrain(train_df)
+    capped_train.train_random_forest_regressor(
+        n_estimators=args.n_estimators, max_depth=args.max_depth, min_samples_leaf=args.min_samples_leaf)
+
+    variants = [
+        ('sklearn', df_train, {}),
+        (f'sklearn compress={args.compress}', df_train, {'compress': args.compress}),
+        (f'sklearn depth<={args.max_depth} leaf>={args.min_samples_leaf}', capped_train, {}),
+        ('compiled', df_train, {'mmap_friendly': True}),
+        (f'compiled compress={args.compress}', df_train, {'mmap_friendly': True, 'compress': args.compress}),
+        ('compiled float32', df_train, {'float32': True})
+    ]
+    for prune_depth in args.prune_depths:
+        variants.append((f'compiled float32 pruned {prune_depth}', df_train,
+                         {'float32': True, 'prune_depth': prune_depth}))
+
+    results = []
+    for name, variant_train, save_options in variants:
+        with tempfile.TemporaryDirectory() as model_dir:
+            predictor, artifact_mb, load_ms = save_and_load(
+                variant_train, df_preprocess.feature_transform, model_dir, **save_options)
+            y_predicted = predictor.predict_matrix(df_train.x_test.to_numpy())
+            r2 = r2_score(df_train.y_test, y_predicted)
+            mae = mean_absolute_error(df_train.y_test, y_predicted)
+        results.append((name, artifact_mb, load_ms, r2, mae))
+
+    # Every variant is compared with the plain uncompressed sklearn pickle in the first row
+    _, baseline_mb, baseline_load_ms, baseline_r2, baseline_mae = results[0]
+    print_header(f'Model artifacts for a {args.n_estimators}-tree forest, deltas vs the uncompressed sklearn pickle')
+    print(f'{"artifact":<32} {"MB":>7} {"load ms":>8} {"R2":>7} {"delta R2":>9} {"MAE":>8} {"delta MAE":>9}')
+    for name, artifact_mb, load_ms, r2, mae in results:
+        print(f'{name:<32} {artifact_mb:>7.1f} {load_ms:>8.1f} {r2:>7.4f} {r2 - baseline_r2:>+9.4f} '
+              f'{mae:>8.1f} {mae - baseline_mae:>+9.1f}')
+
+
+def benchmark_outlier_removal(args):
+    # Repeat the dataset to get a large input
+    df = pd.concat([pd.read_csv(args.csv)] * args.copies, ignore_index=True)
+
+    print_header(f'Outlier removal on {len(df)} rows (ms)')
+    for method in ('sequential', 'single_pass'):
+        p50, p99 = measure_latency(lambda: DFPreprocess(df).remove_outliers(method), args.repeats)
+        removed = len(df) - len(DFPreprocess(df).remove_outliers(method))
+        print(f'{method:<12} p50 {p50:8.3f}   p99 {p99:8.3f}   removed {removed} rows ({removed / len(df):.1%})')
+
+
+def benchmark_loading(args):
+    # Untyped parse, typed parse and a sidecar hit of the same file
+    def load_plain():
+        return pd.read_csv(args.csv)
+
+    variants = [('read_csv', load_plain), ('typed csv', lambda: DFLoad.read_csv_typed(args.csv))]
+    with tempfile.TemporaryDirectory() as directory:
+        if PYARROW_AVAILABLE:
+            df_load = DFLoad(args.csv, directory)
+            df_load.load()
+            sidecar_path = df_load.sidecar_path()
+            variants.append(('feather sidecar', lambda: pd.read_feather(sidecar_path)))
+
+        print_header(f'Loading {args.csv} (ms), pyarrow {"available" if PYARROW_AVAILABLE else "not installed"}')
+        print(f'{"variant":<16} {"p50":>8} {"p99":>8} {"MB":>7}')
+        for name, load in variants:
+            p50, p99 = measure_latency(load, args.repeats)
+            memory_mb = load().memory_usage(deep=True).sum() / 1024 ** 2
+            print(f'{name:<16} {p50:>8.2f} {p99:>8.2f} {memory_mb:>7.1f}')
+
+
+def benchmark_encoders(args):
+    # Repeat the dataset to get a large input, once as plain strings and once as loaded by DFLoad
+    df = pd.concat([pd.read_csv(args.csv)] * args.copies, ignore_index=True)
+    typed_df = pd.concat([DFLoad.read_csv_typed(args.csv)] * args.copies, ignore_index=True)
+    encoders = CategoryEncoder.load_mapping()
+
+    print_header(f'Encoding {len(df)} rows per column, million rows/s (single value p50 in ms)')
+    print(f'{"column":<14} {"LabelEncoder":>13} {"strings":>9} {"categorical":>12} {"row LE":>8} {"row new":>8}')
+    for column in FeatureColumns.CATEGORICAL:
+        label_encoder = joblib.load(f'{args.model_dir}/label_encoder/{column}_label_encoder_model.joblib')
+        encoder = encoders[column]
+        values = df[column]
+        typed_values = typed_df[column]
+        if not np.array_equal(label_encoder.transform(values), encoder.transform(values)):
+            raise ValueError(f'{column} codes of the mapping file and the saved LabelEncoder differ')
+
+        label_encoder_p50, _ = measure_latency(lambda: label_encoder.transform(values), args.repeats)
+        strings_p50, _ = measure_latency(lambda: encoder.transform(values), args.repeats)
+        categorical_p50, _ = measure_latency(lambda: encoder.transform(typed_values), args.repeats)
+        row = values.iloc[:1]
+        row_label_encoder_p50, _ = measure_latency(lambda: label_encoder.transform(row), args.repeats * 10)
+        row_p50, _ = measure_latency(lambda: encoder.transform(row), args.repeats * 10)
+        print(f'{column:<14} {len(df) / label_encoder_p50 / 1000:>13.1f} {len(df) / strings_p50 / 1000:>9.1f} '
+              f'{len(df) / categorical_p50 / 1000:>12.1f} {row_label_encoder_p50:>8.3f} {row_p50:>8.3f}')
+
+
+def benchmark_aggregate_cube(args):
+    df = DFPreprocess(DFLoad(args.csv).load()).remove_outliers()
+    start = time.perf_counter()
+    cube = AggregateCube.from_frame(df)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    # The most frequent combination, so every query finds rows
+    brand, model, year, fuel_type = df.groupby(AggregateCube.DIMENSIONS, observed=True).size().idxmax()
+    queries = [
+        ('all rows', {}),
+        ('brand', {'brand': brand}),
+        ('brand, model', {'brand': brand, 'model': model}),
+        ('year, fuel type', {'year': year, 'fuelType': fuel_type}),
+        ('full slice', {'brand': brand, 'model': model, 'year': year, 'fuelType': fuel_type})
+    ]
+
+    def filter_frame(selection):
+        # The same answer from the frame: boolean masks, then the means of the matching rows
+        mask = np.ones(len(df), dtype=bool)
+        for dimension, value in selection.items():
+            mask &= (df[dimension] == value).to_numpy()
+        return df.loc[mask, AggregateCube.MEASURES].mean()
+
+    print_header(f'Aggregate cube of {len(df)} rows, cells {cube.cells.shape[:-1]}, '
+                 f'{cube.cells.nbytes / 1024 ** 2:.1f} MB, built in {build_ms:.1f} ms (p50 in microseconds)')
+    print(f'{"query":<18} {"rows":>7} {"pandas":>9} {"cube":>9}')
+    for name, selection in queries:
+        pandas_p50, _ = measure_latency(lambda: filter_frame(selection), args.repeats)
+        # The first query of a combination of dimensions sums its marginal, later ones only index it
+        cube.query(**selection)
+        cube_p50, _ = measure_latency(lambda: cube.query(**selection), args.repeats * 10)
+        print(f'{name:<18} {cube.query(**selection)["count"]:>7} {pandas_p50 * 1000:>9.1f} {cube_p50 * 1000:>9.1f}')
+
+
+def benchmark_plot_updates(args):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    df = DFPreprocess(DFLoad(args.csv).load()).remove_outliers()
+    sample_df = df.sample(n=min(100, len(df)), random_state=42)
+    variables = ['year', 'mileage', 'tax', 'mpg', 'engineSize']
+    marker = {'year': 2017, 'mileage': 40000, 'tax': 145, 'mpg': 55, 'engineSize': 1.5}
+    state = {'index': 0}
+
+    def next_variable():
+        # Every update switches to the next variable, the most expensive case for both versions
+        state['index'] = (state['index'] + 1) % len(variables)
+        return variables[state['index']]
+
+    def seaborn_update(ax, canvas, draw):
+        # What update_plot did before: clear, rebuild with seaborn, add the marker, set the texts, draw
+        import seaborn as sns
+
+        variable = next_variable()
+        ax.clear()
+        sns.scatterplot(data=sample_df, y='price', x=variable, ax=ax)
+        ax.scatter(marker[variable], 15000, color='red', marker='x', s=100)
+        ax.vlines(marker[variable], 12000, 18000, color='red', linewidth=2, alpha=0.6)
+        ax.set_title(f'Scatter Plot: Price vs. {variable.capitalize()}')
+        ax.set_xlabel(variable.capitalize(), fontsize=12, labelpad=5)
+        ax.set_ylabel('Price', fontsize=12, labelpad=5)
+        if draw:
+            canvas.draw()
+
+    def view_update(view, canvas, draw):
+        variable = next_variable()
+        view.show(variable, marker[variable], 15000, (12000, 18000))
+        if draw:
+            canvas.draw()
+
+    # seaborn is only needed for the old version, which is skipped without it
+    variants = []
+    if importlib.util.find_spec('seaborn') is not None:
+        figure = Figure()
+        variants.append(('seaborn rebuild', seaborn_update, figure.add_subplot(), FigureCanvasAgg(figure)))
+    figure = Figure()
+    view = ScatterPlotView(figure.add_subplot(), sample_df, variables)
+    variants.append(('persistent artists', view_update, view, FigureCanvasAgg(figure)))
+
+    # Update alone is the work before the repaint, with render includes one full draw of the canvas
+    print_header(f'Scatter plot updates of {len(sample_df)} points, p50 in ms')
+    print(f'{"version":<20} {"update":>8} {"update + render":>16}')
+    for name, update, target, canvas in variants:
+        update(target, canvas, True)
+        update_p50, _ = measure_latency(lambda: update(target, canvas, False), args.repeats)
+        render_p50, _ = measure_latency(lambda: update(target, canvas, True), args.repeats)
+        print(f'{name:<20} {update_p50:>8.2f} {render_p50:>16.2f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Performance benchmarks for the car price prediction pipeline')
+    parser.add_argument('--csv', default='csv/cars.csv', help='dataset used for the benchmarks')
+    parser.add_argument('--model-dir', default='default_model', help='directory with the saved model artifacts')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    forest_parser = subparsers.add_parser('forest', help='compiled forest vs sklearn predict latency')
+    forest_parser.add_argument('--repeats', type=int, default=1000)
+    forest_parser.add_argument('--batch-size', type=int, default=1000)
+    forest_parser.set_defaults(function=benchmark_compiled_forest)
+
+    train_parser = subparsers.add_parser('train', help='training time, accuracy and model cost per forest setting')
+    train_parser.add_argument('--n-estimators', type=int, nargs='+', default=[50, 100])
+    train_parser.add_argument('--max-depth', type=optional_number, nargs='+', default=[None, 20])
+    train_parser.add_argument('--min-samples-leaf', type=int, nargs='+', default=[1])
+    train_parser.add_argument('--max-samples', type=optional_number, nargs='+', default=[None, 0.5],
+                              help='bootstrap sample size per tree, a fraction or a row count')
+    train_parser.add_argument('--n-jobs', type=int, default=-1)
+    train_parser.set_defaults(function=benchmark_training)
+
+    preprocess_parser = subparsers.add_parser('preprocess', help='fitting the encoders and scalers vs a cache hit')
+    preprocess_parser.add_argument('--repeats', type=int, default=20)
+    preprocess_parser.set_defaults(function=benchmark_preprocess_cache)
+
+    backends_parser = subparsers.add_parser('backends', help='random forest vs histogram gradient boosting')
+    backends_parser.add_argument('--repeats', type=int, default=200)
+    backends_parser.add_argument('--batch-size', type=int, default=1000)
+    backends_parser.set_defaults(function=benchmark_backends)
+
+    compact_parser = subparsers.add_parser('compact', help='size, load time and accuracy of the save options')
+    compact_parser.add_argument('--n-estimators', type=int, default=100)
+    compact_parser.add_argument('--max-depth', type=int, default=16, help='depth cap applied while training')
+    compact_parser.add_argument('--min-samples-leaf', type=int, default=2, help='leaf size cap applied while training')
+    compact_parser.add_argument('--prune-depths', type=int, nargs='*', default=[16, 12],
+                                help='depths the compiled forest is pruned to after training')
+    compact_parser.add_argument('--compress', type=int, default=3, help='joblib compression level')
+    compact_parser.set_defaults(function=benchmark_compact_artifacts)
+
+    outliers_parser = subparsers.add_parser('outliers', help='sequential vs single-pass outlier removal')
+    outliers_parser.add_argument('--copies', type=int, default=20, help='how many times the dataset is repeated')
+    outliers_parser.add_argument('--repeats', type=int, default=10)
+    outliers_parser.set_defaults(function=benchmark_outlier_removal)
+
+    load_parser = subparsers.add_parser('load', help='untyped vs typed CSV parsing vs the Feather sidecar')
+    load_parser.add_argument('--repeats', type=int, default=20)
+    load_parser.set_defaults(function=benchmark_loading)
+
+    encoders_parser = subparsers.add_parser('encoders', help='LabelEncoder vs CategoryEncoder throughput')
+    encoders_parser.add_argument('--copies', type=int, default=20, help='how many times the dataset is repeated')
+    encoders_parser.add_argument('--repeats', type=int, default=10)
+    encoders_parser.set_defaults(function=benchmark_encoders)
+
+    cube_parser = subparsers.add_parser('cube', help='aggregate cube queries vs filtering the frame')
+    cube_parser.add_argument('--repeats', type=int, default=100)
+    cube_parser.set_defaults(function=benchmark_aggregate_cube)
+
+    plot_parser = subparsers.add_parser('plot', help='seaborn rebuild vs persistent artists per plot update')
+    plot_parser.add_argument('--repeats', type=int, default=50)
+    plot_parser.set_defaults(function=benchmark_plot_updates)
+
+    args = parser.parse_args()
+    args.function(args)
+
+
+if __name__ == '__main__':
+    main()
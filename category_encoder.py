@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+from features import FeatureColumns
+
+
+class CategoryEncoder:
+    MAPPING_DIRECTORY = 'mapping'
+    # Up to this many values are looked up one by one in the dict
+    SMALL_BATCH = 16
+
+    def __init__(self, classes):
+        # Known categories in code order, every other value gets the reserved code len(classes)
+        self.classes = list(classes)
+        self.unknown_code = len(self.classes)
+
+        # Hash tables category -> code, built once and reused by every call. The pandas index serves
+        # whole columns, the dict serves the single rows of the GUI without the pandas call overhead
+        self.categories = pd.Index(self.classes, dtype=object)
+        self.codes_by_category = {category: code for code, category in enumerate(self.classes)}
+
+    @classmethod
+    def fit(cls, values):
+        # Sorted distinct values, the same codes LabelEncoder.fit assigns
+        return cls(np.unique(np.asarray(pd.Series(values).dropna(), dtype=object)))
+
+    @classmethod
+    def from_label_encoder(cls, label_encoder):
+        return cls(label_encoder.classes_)
+
+    def to_label_encoder(self):
+        # A fitted LabelEncoder with the same codes, for the per-file joblib layout.
+        # Imported here, the GUI imports this module on startup and sklearn is slow to import
+        from sklearn.preprocessing import LabelEncoder
+
+        label_encoder = LabelEncoder()
+        label_encoder.classes_ = np.asarray(self.classes, dtype=object)
+        return label_encoder
+
+    @classmethod
+    def from_mapping_file(cls, path):
+        # One 'code: category' line per category, as in mapping/brand_mapping.txt
+        classes = {}
+        with open(path) as file:
+            for line in file:
+                if line.strip():
+                    code, category = line.rstrip('\n').split(': ', 1)
+                    classes[int(code)] = category
+        return cls([classes[code] for code in range(len(classes))])
+
+    @classmethod
+    def load_mapping(cls, directory=MAPPING_DIRECTORY):
+        return {column: cls.from_mapping_file(f'{directory}/{column}_mapping.txt')
+                for column in FeatureColumns.CATEGORICAL}
+
+    def codes(self, values):
+        # Unseen values and missing values come back as -1
+        if len(values) <= self.SMALL_BATCH:
+            return np.array([self.codes_by_category.get(value, -1) for value in values], dtype=np.int64)
+
+        # One vectorized recode through pandas categorical codes, a categorical column only
+        # looks up its categories and not every row
+        return pd.Categorical(values, categories=self.categories).codes
+
+    def known(self, values):
+        return self.codes(values) >= 0
+
+    def transform(self, values):
+        # Categorical codes are as narrow as int8, widen them before the reserved code goes in
+        codes = self.codes(values).astype(np.int64)
+        codes[codes < 0] = self.unknown_code
+        return codes
+
+    def inverse_transform(self, codes):
+        # The reserved code decodes to None
+        return np.asarray(self.classes + [None], dtype=object)[np.asarray(codes)]
@@ -0,0 +1,163 @@
+import joblib
+import numpy as np
+
+
+class CompiledForest:
+    FILENAME = 'compiled_forest.joblib'
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth):
+        # Node arrays of all trees laid out back to back, children hold global node indices
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+
+        # Global index of the root node of every tree and the depth of the deepest tree
+        self.roots = roots
+        self.max_depth = int(max_depth)
+
+    @classmethod
+    def from_estimators(cls, estimators):
+        # Flatten fitted decision trees into contiguous arrays without importing sklearn
+        features = []
+        thresholds = []
+        lefts = []
+        rights = []
+        values = []
+        roots = []
+        max_depth = 0
+        offset = 0
+
+        for estimator in estimators:
+            tree = estimator.tree_
+            node_ids = np.arange(tree.node_count, dtype=np.int32)
+            is_leaf = tree.children_left < 0
+
+            # Leaves point to themselves so extra traversal steps keep rows in place
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            thresholds.append(np.where(is_leaf, 0.0, tree.threshold).astype(np.float64))
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left).astype(np.int32) + offset)
+            rights.append(np.where(is_leaf, node_ids, tree.children_right).astype(np.int32) + offset)
+            values.append(tree.value[:, 0, 0].astype(np.float64))
+
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += tree.node_count
+
+        return cls(
+            np.concatenate(features),
+            np.concatenate(thresholds),
+            np.concatenate(lefts),
+            np.concatenate(rights),
+            np.concatenate(values),
+            np.array(roots, dtype=np.int32),
+            max_depth
+        )
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        # With mmap_mode='r' the node arrays stay in the page cache shared by all processes
+        state = joblib.load(path, mmap_mode=mmap_mode)
+        return cls(
+            state['feature'],
+            state['threshold'],
+            state['left'],
+            state['right'],
+            state['value'],
+            state['roots'],
+            state['max_depth']
+        )
+
+    def node_depths(self):
+        # Depth of every node below its root, walking all trees one level at a time
+        depths = np.full(len(self.value), -1, dtype=np.int32)
+        frontier = np.asarray(self.roots)
+        depth = 0
+        while frontier.size:
+            depths[frontier] = depth
+            internal = frontier[self.left[frontier] != frontier]
+            frontier = np.concatenate([self.left[internal], self.right[internal]])
+            depth += 1
+        return depths
+
+    def prune(self, max_depth):
+        # Post-hoc pruning: nodes at max_depth become leaves that predict the mean of their samples,
+        # which sklearn already stores as the value of every internal node
+        depths = self.node_depths()
+        keep = (depths >= 0) & (depths <= max_depth)
+        new_index = np.cumsum(keep, dtype=np.int32) - 1
+
+        node_ids = np.arange(len(self.value), dtype=np.int32)
+        is_leaf = (self.left == node_ids) | (depths == max_depth)
+        left = np.where(is_leaf, node_ids, self.left)
+        right = np.where(is_leaf, node_ids, self.right)
+
+        # Drop the nodes below the cut and renumber the children
+        return CompiledForest(
+            np.where(is_leaf, 0, self.feature)[keep],
+            np.where(is_leaf, 0.0, self.threshold)[keep].astype(self.threshold.dtype),
+            new_index[left[keep]],
+            new_index[right[keep]],
+            np.asarray(self.value)[keep],
+            new_index[self.roots],
+            min(self.max_depth, max_depth)
+        )
+
+    def downcast(self):
+        # Store thresholds and leaf values as float32. Every threshold is rounded down, so a float32
+        # input x satisfies x <= threshold exactly when it did with the float64 threshold
+        threshold = np.asarray(self.threshold, dtype=np.float64)
+        threshold32 = threshold.astype(np.float32)
+        threshold32 = np.where(threshold32 > threshold, np.nextafter(threshold32, np.float32(-np.inf)), threshold32)
+        return CompiledForest(
+            self.feature,
+            threshold32,
+            self.left,
+            self.right,
+            np.asarray(self.value, dtype=np.float32),
+            self.roots,
+            self.max_depth
+        )
+
+    def save(self, path, compress=0):
+        state = {
+            'feature': self.feature,
+            'threshold': self.threshold,
+            'left': self.left,
+            'right': self.right,
+            'value': self.value,
+            'roots': self.roots,
+            'max_depth': self.max_depth
+        }
+        # Uncompressed by default, compressed joblib files cannot be memory-mapped
+        joblib.dump(state, path, compress=compress)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def predict_trees(self, x):
+        # Compare in float32 like sklearn does, so splits land on the same side
+        x = np.asarray(x, dtype=np.float32)
+        if x.ndim == 1:
+            x = x.reshape(1, -1)
+
+        # Walk every (row, tree) pair one level per step, dropping pairs that reached a leaf
+        n_rows, n_features = x.shape
+        x_flat = x.ravel()
+        nodes = np.tile(self.roots, n_rows)
+        row_offsets = np.repeat(np.arange(n_rows) * n_features, self.n_trees)
+        active = np.arange(nodes.size)
+        while active.size:
+            current = nodes[active]
+            go_left = x_flat[row_offsets[active] + self.feature[current]] <= self.threshold[current]
+            following = np.where(go_left, self.left[current], self.right[current])
+            nodes[active] = following
+            active = active[following != current]
+
+        # One column of leaf values per tree
+        return self.value[nodes].reshape(n_rows, self.n_trees)
+
+    def predict(self, x):
+        return self.predict_trees(x).mean(axis=1)
@@ -1,59 +1,241 @@
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
 import pandas as pd
+
 import text_format
+from df_load import DFLoad
+
+text_format = text_format.TextFormat
+
+QUANTILES = [0.25, 0.5, 0.75]
+
+# String columns with more distinct values than this keep only their cardinality in the report
+MAX_REPORTED_VALUES = 200
+
+
+class AnalysisReport:
+    def __init__(self, fingerprint, n_rows, duplicated_rows, columns):
+        # Statistics of one DataFrame. columns maps every column name to a dict with its dtype, count,
+        # null count and cardinality, plus min/max/mean/std/quartiles for numbers
+        # or the distinct values and the most frequent one for strings
+        self.fingerprint = fingerprint
+        self.n_rows = n_rows
+        self.duplicated_rows = duplicated_rows
+        self.columns = columns
+
+    @property
+    def null_count(self):
+        return sum(stats['nulls'] for stats in self.columns.values())
+
+    def numeric_columns(self):
+        return [column for column, stats in self.columns.items() if stats['kind'] == 'numeric']
+
+    def string_columns(self):
+        return [column for column, stats in self.columns.items() if stats['kind'] == 'string']
+
+    def to_dict(self):
+        return {
+            'fingerprint': self.fingerprint,
+            'n_rows': self.n_rows,
+            'duplicated_rows': self.duplicated_rows,
+            'columns': self.columns
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state['fingerprint'], state['n_rows'], state['duplicated_rows'], state['columns'])
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def render(self):
+        # Text version of the report for the console, in the sections the analysis always printed
+        lines = [f"\n{text_format.BOLD}Number of rows:{text_format.RESET} {self.n_rows}",
+                 f"{text_format.BOLD}Number of columns:{text_format.RESET} {len(self.columns)}"]
+
+        lines.append(f"\n{text_format.BOLD}Columns:{text_format.RESET}\n")
+        lines.append(f'{"column":<14} {"dtype":<10} {"non-null":>9} {"nulls":>6} {"unique":>7}')
+        for column, stats in self.columns.items():
+            lines.append(f'{column:<14} {stats["dtype"]:<10} {stats["count"]:>9} {stats["nulls"]:>6} '
+                         f'{stats["unique"]:>7}')
+
+        for column in self.string_columns():
+            stats = self.columns[column]
+            lines.append(f"\n{text_format.BOLD}Unique {column} values:{text_format.RESET}\n")
+            if 'values' in stats:
+                lines.append(', '.join(stats['values']))
+            else:
+                lines.append(f'{stats["unique"]} distinct values')
+            lines.append(f'most frequent: {stats["top"]} ({stats["top_count"]} rows)')
+
+        lines.append(f"\n{text_format.BOLD}Summary Statistics:{text_format.RESET}\n")
+        names = ['min', 'max', 'mean', 'std'] + [f'{q:.0%}' for q in QUANTILES]
+        lines.append(f'{"column":<14} ' + ' '.join(f'{name:>12}' for name in names))
+        for column in self.numeric_columns():
+            stats = self.columns[column]
+            lines.append(f'{column:<14} ' + ' '.join(f'{stats[name]:>12.4g}' for name in names))
+
+        lines.append(f"\n{text_format.BOLD}Missing values:{text_format.RESET} {self.null_count}")
+        lines.append(f"{text_format.BOLD}Duplicated rows:{text_format.RESET} {self.duplicated_rows}")
+        return '\n'.join(lines)
+
+    def __str__(self):
+        return (f'{self.n_rows} rows, {len(self.columns)} columns, {self.null_count} missing values, '
+                f'{self.duplicated_rows} duplicated rows')
+
+
+def sorted_quantiles(values, quantiles):
+    # Linear interpolation between the closest ranks, the same as DataFrame.quantile()
+    positions = np.asarray(quantiles) * (len(values) - 1)
+    lower = np.floor(positions).astype(int)
+    upper = np.ceil(positions).astype(int)
+    return values[lower] + (values[upper] - values[lower]) * (positions - lower)
 
 
 class DFAnalyze:
-    def __init__(self, df):
+    DIRECTORY = 'cache/analysis'
+
+    def __init__(self, df, directory=DIRECTORY, keep_reports=50):
         self.df = df
-        self.text_format = text_format.TextFormat
-        pd.set_option('display.max_rows', None)
-        pd.set_option('display.max_columns', None)
-
-    def analyze(self):
-        # Print the first few rows of the DataFrame
-        print(f"\n{self.text_format.BOLD}First Few Rows:{self.text_format.RESET}\n")
-        print(self.df.head())
-
-        # Print the last few rows of the DataFrame
-        print(f"\n{self.text_format.BOLD}Last Few Rows:{self.text_format.RESET}\n")
-        print(self.df.tail())
-
-        # Print the shape of our data
-        print(f"\n{self.text_format.BOLD}Number of rows:{self.text_format.RESET}\n")
-        print(self.df.shape[0])
-        print(f"\n{self.text_format.BOLD}Number of columns:{self.text_format.RESET}\n")
-        print(self.df.shape[1])
-
-        # Print basic information about the DataFrame
-        print(f"\n{self.text_format.BOLD}DataFrame Info:{self.text_format.RESET}\n")
-        print(self.df.info())
-
-        # Print unique values of 4 columns of object datatype (String)
-        print(f"\n{self.text_format.BOLD}Unique brand values:{self.text_format.RESET}\n")
-        print(self.df.brand.unique())
-        print(f"\n{self.text_format.BOLD}Unique model values:{self.text_format.RESET}\n")
-        print(self.df.model.unique())
-        print(f"\n{self.text_format.BOLD}Unique transmission values:{self.text_format.RESET}\n")
-        print(self.df.transmission.unique())
-        print(f"\n{self.text_format.BOLD}Unique fuelType values:{self.text_format.RESET}\n")
-        print(self.df.fuelType.unique())
-
-        # Print summary statistics
-        print(f"\n{self.text_format.BOLD}Summary Statistics:{self.text_format.RESET}\n")
-        print(self.df.describe())
-
-        # Print the number of missing values in each column
-        print(f"\n{self.text_format.BOLD}Missing Values:{self.text_format.RESET}\n")
-        print(self.df.isnull().sum())
-
-        # Print the number of duplicate values in DataFrame
-        print(f"\n{self.text_format.BOLD}Duplicated Values:{self.text_format.RESET}\n")
-        print(self.df.duplicated().sum())
-
-        # Print string columns of the DataFrame
-        print(f"\n{self.text_format.BOLD}String columns of the DataFrame:{self.text_format.RESET}\n")
-        print(self.df.select_dtypes(include=['object']).head())
-
-        # Print integer columns of the DataFrame
-        print(f"\n{self.text_format.BOLD}Integer columns of the DataFrame:{self.text_format.RESET}\n")
-        print(self.df.select_dtypes(include=['number']).head())
+        self.directory = directory
+        self.keep_reports = keep_reports
+
+    def row_hashes(self):
+        # One 64-bit hash per row, used both for the duplicate count and the fingerprint
+        return pd.util.hash_pandas_object(self.df, index=False).to_numpy()
+
+    def fingerprint(self, row_hashes):
+        # Same columns, same dtypes and the same rows in the same order give the same fingerprint
+        digest = hashlib.sha256(row_hashes.tobytes())
+        digest.update(json.dumps([[column, str(dtype)] for column, dtype in self.df.dtypes.items()]).encode())
+        return digest.hexdigest()
+
+    def numeric_stats(self, columns):
+        # All numerical columns as one block and one sort along the rows. The sorted columns give
+        # min, max, the quartiles and the cardinality, missing values are sorted to the end
+        block = np.sort(self.df[columns].to_numpy(dtype=np.float64), axis=0)
+        counts = len(block) - np.isnan(block).sum(axis=0)
+
+        stats = {}
+        for i, column in enumerate(columns):
+            values = block[:counts[i], i]
+            column_stats = {
+                'kind': 'numeric',
+                'dtype': str(self.df[column].dtype),
+                'count': int(counts[i]),
+                'nulls': int(len(block) - counts[i]),
+                'unique': int((np.diff(values) != 0).sum() + 1) if len(values) else 0
+            }
+            if len(values):
+                column_stats.update({
+                    'min': float(values[0]),
+                    'max': float(values[-1]),
+                    'mean': float(values.mean()),
+                    'std': float(values.std(ddof=1)) if len(values) > 1 else float('nan')
+                })
+                quartiles = sorted_quantiles(values, QUANTILES)
+            else:
+                column_stats.update({'min': float('nan'), 'max': float('nan'), 'mean': float('nan'),
+                                     'std': float('nan')})
+                quartiles = [float('nan')] * len(QUANTILES)
+            column_stats.update({f'{q:.0%}': float(value) for q, value in zip(QUANTILES, quartiles)})
+            stats[column] = column_stats
+        return stats
+
+    def string_stats(self, column):
+        # One hash pass: factorize gives the distinct values in order of appearance and a code per row,
+        # the code counts give the nulls and the most frequent value
+        codes, uniques = pd.factorize(self.df[column])
+        known = codes[codes >= 0]
+        frequencies = np.bincount(known, minlength=len(uniques))
+
+        stats = {
+            'kind': 'string',
+            'dtype': str(self.df[column].dtype),
+            'count': int(len(known)),
+            'nulls': int(len(codes) - len(known)),
+            'unique': int(len(uniques)),
+            'top': str(uniques[frequencies.argmax()]) if len(uniques) else None,
+            'top_count': int(frequencies.max()) if len(uniques) else 0
+        }
+        if len(uniques) <= MAX_REPORTED_VALUES:
+            stats['values'] = [str(value) for value in uniques]
+        return stats
+
+    def compute(self, fingerprint, row_hashes):
+        numeric_columns = [column for column in self.df.columns if pd.api.types.is_numeric_dtype(self.df[column])]
+        columns = self.numeric_stats(numeric_columns) if numeric_columns else {}
+        for column in self.df.columns:
+            if column not in columns:
+                columns[column] = self.string_stats(column)
+
+        # Keep the column order of the DataFrame
+        columns = {column: columns[column] for column in self.df.columns}
+        duplicated_rows = len(row_hashes) - len(pd.unique(row_hashes))
+        return AnalysisReport(fingerprint, len(self.df), int(duplicated_rows), columns)
+
+    def report_path(self, fingerprint):
+        return f'{self.directory}/{fingerprint}.json'
+
+    def load_report(self, fingerprint):
+        path = self.report_path(fingerprint)
+        if not os.path.exists(path):
+            return None
+        with open(path) as file:
+            report = AnalysisReport.from_dict(json.load(file))
+        # Mark the report as recently used for the eviction order
+        os.utime(path)
+        return report
+
+    def save_report(self, report):
+        os.makedirs(self.directory, exist_ok=True)
+        temporary_path = f'{self.report_path(report.fingerprint)}.tmp'
+        with open(temporary_path, 'w') as file:
+            file.write(report.to_json())
+        os.replace(temporary_path, self.report_path(report.fingerprint))
+
+        # Keep only the most recently used reports
+        names = [name for name in os.listdir(self.directory) if name.endswith('.json')]
+        names.sort(key=lambda name: os.stat(f'{self.directory}/{name}').st_mtime)
+        for name in names[:-self.keep_reports]:
+            os.remove(f'{self.directory}/{name}')
+
+    def analyze(self, use_cache=True):
+        # Hashing the rows is the only pass over the data when the same data was analyzed before
+        row_hashes = self.row_hashes()
+        fingerprint = self.fingerprint(row_hashes)
+        if use_cache:
+            report = self.load_report(fingerprint)
+            if report is not None:
+                return report
+
+        report = self.compute(fingerprint, row_hashes)
+        if use_cache:
+            self.save_report(report)
+        return report
+
+
+# Print the report of a CSV file, or write it as JSON:
+# python df_analyze.py csv/cars.csv --json report.json
+def main():
+    parser = argparse.ArgumentParser(description='Statistics of a CSV file of car listings')
+    parser.add_argument('csv_path', nargs='?', default='csv/cars.csv')
+    parser.add_argument('--json', default=None, help='write the report to this JSON file instead of printing it')
+    parser.add_argument('--no-cache', action='store_true', help='analyze again even if a report is cached')
+    args = parser.parse_args()
+
+    report = DFAnalyze(DFLoad(args.csv_path).load()).analyze(use_cache=not args.no_cache)
+    if args.json:
+        with open(args.json, 'w') as file:
+            file.write(report.to_json())
+        print(f'Analysis report written to {args.json}')
+    else:
+        print(report.render())
+
+
+if __name__ == '__main__':
+    main()
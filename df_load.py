@@ -0,0 +1,102 @@
+import hashlib
+import importlib.util
+import os
+import time
+
+import pandas as pd
+
+# pyarrow is listed in requirements.txt, it speeds up parsing and writes the Feather sidecar files.
+# Without it loading still works, through the C parser and without a sidecar
+PYARROW_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+
+class DFLoad:
+    DIRECTORY = 'cache/load'
+
+    # Column types of the car listings. String columns load as categoricals, integer columns are
+    # narrowed to the smallest integer type that holds their values, floats stay float64 so the
+    # decimal values match the GUI inputs exactly
+    SCHEMA = {
+        'brand': 'category',
+        'model': 'category',
+        'year': 'integer',
+        'transmission': 'category',
+        'mileage': 'integer',
+        'fuelType': 'category',
+        'tax': 'integer',
+        'mpg': 'float64',
+        'engineSize': 'float64',
+        'price': 'integer'
+    }
+
+    def __init__(self, csv_path, directory=DIRECTORY, use_sidecar=True):
+        self.csv_path = csv_path
+        self.directory = directory
+        self.use_sidecar = use_sidecar and PYARROW_AVAILABLE
+
+        # Filled by load(): where the rows came from, how long it took and the memory they take
+        self.source = None
+        self.load_seconds = None
+        self.memory_bytes = None
+
+    @classmethod
+    def read_csv_typed(cls, csv_path, **kwargs):
+        # The parse types are given upfront, only the integer columns are narrowed afterwards,
+        # since a column with missing values has to stay a float
+        dtype = {column: kind for column, kind in cls.SCHEMA.items() if kind != 'integer'}
+        engine = 'pyarrow' if PYARROW_AVAILABLE and 'chunksize' not in kwargs else 'c'
+        df = pd.read_csv(csv_path, dtype=dtype, engine=engine, **kwargs)
+        if 'chunksize' in kwargs:
+            return (cls.narrow_integers(chunk) for chunk in df)
+        return cls.narrow_integers(df)
+
+    @classmethod
+    def narrow_integers(cls, df):
+        for column, kind in cls.SCHEMA.items():
+            if kind == 'integer' and column in df.columns:
+                df[column] = pd.to_numeric(df[column], downcast='integer')
+        return df
+
+    def sidecar_prefix(self):
+        # One sidecar per source path, older versions of it share the prefix and are replaced
+        path_hash = hashlib.sha256(os.path.abspath(self.csv_path).encode()).hexdigest()[:16]
+        name = os.path.splitext(os.path.basename(self.csv_path))[0]
+        return f'{name}-{path_hash}-'
+
+    def sidecar_path(self):
+        # Size and modification time are part of the name, an edited source file never matches an old sidecar
+        stat = os.stat(self.csv_path)
+        return f'{self.directory}/{self.sidecar_prefix()}{stat.st_size}-{stat.st_mtime_ns}.feather'
+
+    def write_sidecar(self, df, path):
+        os.makedirs(self.directory, exist_ok=True)
+        for name in os.listdir(self.directory):
+            if name.startswith(self.sidecar_prefix()):
+                os.remove(f'{self.directory}/{name}')
+
+        # Write to a temporary file first so a crash never leaves a half-written sidecar behind
+        temporary_path = f'{path}.tmp'
+        df.reset_index(drop=True).to_feather(temporary_path)
+        os.replace(temporary_path, path)
+
+    def load(self):
+        start = time.perf_counter()
+
+        if self.use_sidecar:
+            path = self.sidecar_path()
+            if os.path.exists(path):
+                df = pd.read_feather(path)
+                self.source = 'sidecar'
+            else:
+                df = self.read_csv_typed(self.csv_path)
+                self.write_sidecar(df, path)
+                self.source = 'csv'
+        else:
+            df = self.read_csv_typed(self.csv_path)
+            self.source = 'csv'
+
+        self.load_seconds = time.perf_counter() - start
+        self.memory_bytes = int(df.memory_usage(deep=True).sum())
+        print(f'Loaded {len(df)} rows of {self.csv_path} from the {self.source} in {self.load_seconds * 1000:.0f} ms '
+              f'({self.memory_bytes / 1024 ** 2:.1f} MB)')
+        return df
@@ -0,0 +1,189 @@
+import argparse
+import threading
+from collections import OrderedDict
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from compiled_forest import CompiledForest
+from feature_transform import FeatureTransform
+from features import FeatureColumns
+from model_manifest import BACKEND_FILENAMES, read_manifest
+from model_registry import resolve_model_dir
+
+
+class PredictionCache:
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        # The predictor is shared with worker threads
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            # Evict the least recently used entries
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __str__(self):
+        return f'{self.hits} hits, {self.misses} misses, {len(self.entries)}/{self.maxsize} entries'
+
+
+class DFPredict:
+    MODEL_FILENAME = BACKEND_FILENAMES['random_forest']
+
+    def __init__(self, model, feature_transform, cache_size=4096):
+        # Cached predictions belong to this model and transform pair, so replacing the
+        # predictor after a retrain or a model load starts with an empty cache
+        self.cache = PredictionCache(cache_size)
+        self.model = model
+        self.feature_transform = feature_transform
+
+    def __setattr__(self, name, value):
+        # Swapping the model or the transform in place invalidates the cache as well
+        if name in ('model', 'feature_transform'):
+            self.cache.clear()
+        if name == 'model':
+            # Node arrays for per-tree outputs, compiled on first use for sklearn forests
+            super().__setattr__('forest', value if isinstance(value, CompiledForest) else None)
+        super().__setattr__(name, value)
+
+    @classmethod
+    def load(cls, model_dir='default_model', mmap_mode='r'):
+        # The manifest declares the estimator backend and the artifact format of the directory
+        manifest = read_manifest(model_dir)
+
+        model_path = f"{model_dir}/{manifest['model_file']}"
+        if manifest['format'] == 'compiled_forest':
+            # The compiled forest predicts without sklearn's per-call overhead and its arrays are
+            # memory-mapped, so worker processes share one copy in the page cache.
+            # Compressed files are decompressed into memory instead, they cannot be mapped
+            model = CompiledForest.load(model_path, None if manifest['compress'] else mmap_mode)
+        else:
+            # Load the saved model of the declared backend, joblib detects compression by itself
+            model = joblib.load(model_path)
+
+        # Load the fused encode + scale transform, or the per-file encoders and scalers
+        feature_transform = FeatureTransform.load_from_dir(model_dir, mmap_mode)
+
+        return cls(model, feature_transform)
+
+    def transform_frame(self, df):
+        return self.feature_transform.transform(df)
+
+    def predict_matrix(self, x):
+        # Keep the column names when the model was fitted on a DataFrame
+        if getattr(self.model, 'feature_names_in_', None) is not None:
+            x = pd.DataFrame(x, columns=FeatureColumns.FEATURES)
+
+        return self.model.predict(x)
+
+    @property
+    def has_intervals(self):
+        # Intervals come from the spread of the individual trees, boosted models have no such spread
+        return self.forest is not None or hasattr(self.model, 'estimators_')
+
+    def predict_tree_matrix(self, x):
+        # Per-tree predictions, one column per tree, from a single vectorized traversal
+        if self.forest is None:
+            if not hasattr(self.model, 'estimators_'):
+                raise ValueError(f'{type(self.model).__name__} has no per-tree predictions')
+            self.forest = CompiledForest.from_estimators(self.model.estimators_)
+        return self.forest.predict_trees(x)
+
+    def predict_interval_matrix(self, x, quantiles):
+        # Mean and quantiles over the trees as one stacked array operation per batch
+        tree_predictions = self.predict_tree_matrix(x)
+        bounds = np.quantile(tree_predictions, quantiles, axis=1).T
+        return np.column_stack([tree_predictions.mean(axis=1), bounds])
+
+    def predict_cached(self, x, predict_rows, tag):
+        # Look every row up by its encoded and scaled feature vector
+        keys = [(tag,) + tuple(row) for row in x.tolist()]
+        results = [None] * len(keys)
+        missing = []
+        for i, key in enumerate(keys):
+            results[i] = self.cache.get(key)
+            if results[i] is None:
+                missing.append(i)
+
+        # Predict all cache misses in one call
+        if missing:
+            for i, value in zip(missing, predict_rows(x[missing])):
+                results[i] = value
+                self.cache.put(keys[i], value)
+
+        return np.array(results)
+
+    def predict_frame(self, df, use_cache=False):
+        x = self.transform_frame(df)
+        if not use_cache:
+            return self.predict_matrix(x)
+        return self.predict_cached(x, self.predict_matrix, 'price')
+
+    def predict_interval_frame(self, df, quantiles=(0.1, 0.9), use_cache=False):
+        # Mean price plus one column per quantile, e.g. p10 and p90
+        x = self.transform_frame(df)
+        quantiles = tuple(quantiles)
+        if use_cache:
+            results = self.predict_cached(x, lambda rows: self.predict_interval_matrix(rows, quantiles), quantiles)
+        else:
+            results = self.predict_interval_matrix(x, quantiles)
+
+        columns = ['price'] + [f'p{quantile * 100:g}' for quantile in quantiles]
+        return pd.DataFrame(results.reshape(len(x), len(columns)), columns=columns, index=df.index)
+
+    def predict_price_frame(self, df, quantiles=(0.1, 0.9), use_cache=False):
+        # The interval columns when the backend has them, otherwise only the price
+        if self.has_intervals:
+            return self.predict_interval_frame(df, quantiles, use_cache)
+        return pd.DataFrame({'price': self.predict_frame(df, use_cache)}, index=df.index)
+
+
+# Score a CSV of listings in bulk: python df_predict.py input.csv output.csv [--quantiles 0.1 0.9]
+def main():
+    parser = argparse.ArgumentParser(description='Predict prices for a CSV file of cars')
+    parser.add_argument('input_path')
+    parser.add_argument('output_path')
+    parser.add_argument('--model-dir', help='directory with the saved model artifacts, '
+                                             'the current registry version or default_model if not given')
+    parser.add_argument('--quantiles', type=float, nargs='*',
+                        help='also write these quantiles of the per-tree predictions, e.g. 0.1 0.9')
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input_path)
+    predictor = DFPredict.load(args.model_dir or resolve_model_dir()[0])
+    if args.quantiles:
+        intervals = predictor.predict_interval_frame(df, args.quantiles)
+        df['predicted_price'] = intervals.pop('price')
+        df = df.join(intervals.add_prefix('predicted_price_'))
+    else:
+        df['predicted_price'] = predictor.predict_frame(df)
+    df.to_csv(args.output_path, index=False)
+    print(f'Predicted {len(df)} prices saved as {args.output_path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,29 @@
 import joblib
 import pandas as pd
-from sklearn.preprocessing import LabelEncoder, MinMaxScaler
+from sklearn.preprocessing import MinMaxScaler
+
+from category_encoder import CategoryEncoder
+from feature_transform import FeatureTransform
+from features import FeatureColumns
 
 
 class DFPreprocess:
+    # Numerical columns filtered by the IQR rule
+    OUTLIER_COLUMNS = [
+        'year',
+        'mileage',
+        'tax',
+        'mpg',
+        'engineSize',
+        'price'
+    ]
+
     def __init__(self, df):
         self.df = df.copy()
+        self.category_encoders = {}
+        self.scalers = {}
+        self.feature_transform = None
+        self.outlier_method = 'sequential'
 
     def remove_outliers_in_column(self, column):
         q1 = self.df[column].quantile(0.25)
@@ -13,78 +31,136 @@ class DFPreprocess:
         iqr = q3 - q1
         self.df = self.df[(self.df[column] > q1 - 1.5 * iqr) & (self.df[column] < q3 + 1.5 * iqr)]
 
-    def remove_outliers(self):
-        # Remove outliers from numerical columns
-        numerical_columns = [
-            'year',
-            'mileage',
-            'tax',
-            'mpg',
-            'engineSize',
-            'price'
-        ]
-        for column in numerical_columns:
-            if column in self.df.columns:
-                self.remove_outliers_in_column(column)
+    @classmethod
+    def outlier_bounds(cls, df):
+        # IQR fences of all outlier columns from one quantile call
+        values = df[[column for column in cls.OUTLIER_COLUMNS if column in df.columns]]
+        quartiles = values.quantile([0.25, 0.75])
+        q1 = quartiles.loc[0.25]
+        q3 = quartiles.loc[0.75]
+        iqr = q3 - q1
+        return q1 - 1.5 * iqr, q3 + 1.5 * iqr
 
+    @staticmethod
+    def outlier_mask(df, lower, upper):
+        # Rows strictly inside the fences in every column
+        values = df[lower.index]
+        return ((values > lower) & (values < upper)).all(axis=1)
+
+    def remove_outliers(self, method='sequential'):
+        columns = [column for column in self.OUTLIER_COLUMNS if column in self.df.columns]
+
+        if method == 'sequential':
+            # Remove outliers from numerical columns one after another,
+            # the quartiles of each column are taken on the rows that survived the previous ones
+            for column in columns:
+                self.remove_outliers_in_column(column)
+        elif method == 'single_pass':
+            # All quartiles of the original rows in one call, one combined mask and a single filtered copy
+            lower, upper = self.outlier_bounds(self.df)
+            self.df = self.df[self.outlier_mask(self.df, lower, upper)]
+        else:
+            raise ValueError(f'Unknown outlier removal method {method}, use sequential or single_pass')
+
+        self.outlier_method = method
         return self.df
 
-    def encode_categorical_columns(self, columns):
-        encoder = LabelEncoder()
+    def encode_categorical_columns(self, columns, save_legacy=False):
         for column in columns:
-            self.df[column] = encoder.fit_transform(self.df[column])
+            encoder = CategoryEncoder.fit(self.df[column])
+            self.df[column] = encoder.transform(self.df[column])
+            self.category_encoders[column] = encoder
 
-            # Save the LabelEncoder to a file
-            label_encoder_filename = f'{column}_label_encoder_model.joblib'
-            joblib.dump(encoder, f'saved_model/label_encoder/{label_encoder_filename}')
-            print(f'Label encoder model for {column} saved as saved_model/label_encoder/{label_encoder_filename}')
+            if save_legacy:
+                # Save the encoder as a LabelEncoder with the same codes
+                label_encoder_filename = f'{column}_label_encoder_model.joblib'
+                joblib.dump(encoder.to_label_encoder(), f'saved_model/label_encoder/{label_encoder_filename}')
+                print(f'Label encoder model for {column} saved as saved_model/label_encoder/{label_encoder_filename}')
 
-    def scale_numeric_columns(self, columns):
-        scalers = {}
+    def scale_numeric_columns(self, columns, save_legacy=False):
         scaled_data = {}
 
         for column in columns:
             scaler = MinMaxScaler(copy=True, feature_range=(0, 1))
-            scaled_data[column] = scaler.fit_transform(self.df[[column]])
-            scalers[column] = scaler
+            scaled_data[column] = scaler.fit_transform(self.df[[column]])[:, 0]
+            self.scalers[column] = scaler
 
-            # Save the trained scaler
-            scaler_filename = f'{column}_scaler_model.joblib'
-            joblib.dump(scaler, f'saved_model/scaler/{scaler_filename}')
-            print(f'Scaler model for {column} saved as saved_model/scaler/{scaler_filename}')
+            if save_legacy:
+                # Save the trained scaler
+                scaler_filename = f'{column}_scaler_model.joblib'
+                joblib.dump(scaler, f'saved_model/scaler/{scaler_filename}')
+                print(f'Scaler model for {column} saved as saved_model/scaler/{scaler_filename}')
 
-        scaled_numeric_df = pd.concat([pd.DataFrame(scaled_data[column], columns=[column]) for column in columns], axis=1)
+        scaled_numeric_df = pd.DataFrame(scaled_data, columns=columns)
 
         # Add the 'price' column back to the DataFrame without scaling it
-        scaled_numeric_df['price'] = self.df['price']
+        scaled_numeric_df['price'] = self.df['price'].to_numpy()
 
         self.df = scaled_numeric_df
 
-    def preprocess(self):
+    def fit_transform(self, save_legacy=False):
+        # Encode categorical columns
+        self.encode_categorical_columns(FeatureColumns.CATEGORICAL, save_legacy)
+
+        # Scale numeric columns
+        self.scale_numeric_columns(FeatureColumns.FEATURES, save_legacy)
+
+        # Fuse all encoders and scalers into a single transform artifact
+        self.feature_transform = FeatureTransform.from_fitted(self.category_encoders, self.scalers)
+
+        return self.df
+
+    def cache_params(self):
+        # Everything besides the file contents that changes the preprocessing output
+        return {
+            'version': 1,
+            'outliers': f'iqr-1.5-{self.outlier_method}',
+            'categorical': FeatureColumns.CATEGORICAL,
+            'features': FeatureColumns.FEATURES
+        }
+
+    def fit_transform_cached(self, cache, key):
+        # Reuse the feature matrix, prices and fitted transform of a byte-identical file
+        cached = cache.get(key)
+        if cached is not None:
+            x, y, self.feature_transform = cached
+            self.df = pd.DataFrame(x, columns=FeatureColumns.FEATURES)
+            self.df['price'] = y
+            print(f'Preprocessed data loaded from cache entry {key[:12]}')
+            return self.df
+
+        self.fit_transform()
+        cache.put(key, self.df[FeatureColumns.FEATURES].to_numpy(), self.df['price'].to_numpy(), self.feature_transform)
+        return self.df
+
+    def transform(self, feature_transform):
+        # Encode and scale with an already fitted transform, so new rows match the existing model
+        self.feature_transform = feature_transform
+
+        # Categories the transform has never seen share the reserved unknown code of their column,
+        # so new trees can still learn from those rows
+        known = feature_transform.known_rows(self.df)
+        if not known.all():
+            print(f'{(~known).sum()} rows with previously unseen categories are encoded as unknown')
+
+        scaled_numeric_df = pd.DataFrame(feature_transform.transform(self.df), columns=FeatureColumns.FEATURES)
+        scaled_numeric_df['price'] = self.df['price'].to_numpy()
+        self.df = scaled_numeric_df
+
+        return self.df
+
+    def save_feature_transform(self, model_dir='saved_model'):
+        self.feature_transform.save(f'{model_dir}/{FeatureTransform.FILENAME}')
+        print(f'Feature transform saved as {model_dir}/{FeatureTransform.FILENAME}')
+
+    def preprocess(self, save=True, save_legacy=False):
         # Remove outliers
         self.remove_outliers()
 
-        # Encode categorical columns
-        categorical_columns = [
-            'brand',
-            'model',
-            'transmission',
-            'fuelType'
-        ]
-        self.encode_categorical_columns(categorical_columns)
+        # Encode and scale the remaining rows
+        self.fit_transform(save_legacy)
 
-        # Scale numeric columns
-        numeric_columns_to_scale = [
-            'brand',
-            'model',
-            'year',
-            'transmission',
-            'mileage',
-            'fuelType',
-            'tax',
-            'mpg',
-            'engineSize'
-        ]
-        self.scale_numeric_columns(numeric_columns_to_scale)
+        if save:
+            self.save_feature_transform()
 
         return self.df
@@ -0,0 +1,184 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from category_encoder import CategoryEncoder
+from df_load import DFLoad
+from df_preprocess import DFPreprocess
+from df_train import DFTrain
+from feature_transform import FeatureTransform
+from features import FeatureColumns
+from model_registry import ModelRegistry
+
+
+class DFStreamPreprocess:
+    FEATURES_FILENAME = 'features.npy'
+    PRICES_FILENAME = 'prices.npy'
+    META_FILENAME = 'stream_meta.json'
+
+    def __init__(self, csv_path, output_dir, chunksize=100_000, sample_size=100_000, random_state=42):
+        self.csv_path = csv_path
+        self.output_dir = output_dir
+        self.chunksize = chunksize
+        self.sample_size = sample_size
+        self.random_state = random_state
+
+        # Filled by scan(): uniform sample of the raw rows, category vocabularies and the row count
+        self.sample_df = None
+        self.categories = None
+        self.total_rows = 0
+
+        # Filled by write_matrix(): the memory-mapped feature matrix, the prices and the fitted transform
+        self.x = None
+        self.y = None
+        self.feature_transform = None
+        self.outlier_method = 'single_pass'
+
+    def read_chunks(self):
+        return DFLoad.read_csv_typed(self.csv_path, chunksize=self.chunksize)
+
+    def scan(self, progress=None):
+        # First pass: a bottom-k reservoir (every row gets a random key, the sample_size smallest keys stay)
+        # is a uniform sample of the whole file, used as the quantile sketch and for the plot,
+        # plus the category vocabularies and the row count
+        rng = np.random.default_rng(self.random_state)
+        vocabularies = {column: set() for column in FeatureColumns.CATEGORICAL}
+        sample = None
+        keys = None
+
+        for chunk in self.read_chunks():
+            self.total_rows += len(chunk)
+            for column in FeatureColumns.CATEGORICAL:
+                vocabularies[column].update(chunk[column].dropna().unique())
+
+            chunk_keys = rng.random(len(chunk))
+            if sample is None:
+                sample, keys = chunk, chunk_keys
+            else:
+                sample = pd.concat([sample, chunk], ignore_index=True)
+                keys = np.concatenate([keys, chunk_keys])
+
+            if len(sample) > self.sample_size:
+                keep = np.sort(np.argpartition(keys, self.sample_size)[:self.sample_size])
+                sample = sample.iloc[keep].reset_index(drop=True)
+                keys = keys[keep]
+
+            if progress is not None:
+                progress(f'Scanning CSV file... {self.total_rows} rows', None)
+
+        self.sample_df = sample
+        # Sorted like CategoryEncoder.fit, so the codes match the in-memory pipeline
+        self.categories = {column: sorted(vocabularies[column]) for column in FeatureColumns.CATEGORICAL}
+        return self.sample_df
+
+    def write_matrix(self, progress=None):
+        # IQR fences from the sample, the same rule as DFPreprocess.remove_outliers(method='single_pass')
+        lower, upper = DFPreprocess.outlier_bounds(self.sample_df)
+        encoders = {column: CategoryEncoder(self.categories[column]) for column in FeatureColumns.CATEGORICAL}
+
+        # Second pass: filter, encode and write every chunk straight into the preallocated on-disk matrix.
+        # Scaling needs the min and max of the kept rows, so it is applied in place afterwards
+        os.makedirs(self.output_dir, exist_ok=True)
+        n_features = len(FeatureColumns.FEATURES)
+        x = np.lib.format.open_memmap(f'{self.output_dir}/{self.FEATURES_FILENAME}', mode='w+', dtype=np.float32,
+                                      shape=(self.total_rows, n_features))
+        y = np.lib.format.open_memmap(f'{self.output_dir}/{self.PRICES_FILENAME}', mode='w+', dtype=np.float64,
+                                      shape=(self.total_rows,))
+        data_min = np.full(n_features, np.inf)
+        data_max = np.full(n_features, -np.inf)
+        n_rows = 0
+
+        for chunk in self.read_chunks():
+            chunk = chunk[DFPreprocess.outlier_mask(chunk, lower, upper)]
+            values = np.empty((len(chunk), n_features))
+            for i, column in enumerate(FeatureColumns.FEATURES):
+                if column in encoders:
+                    # The vocabularies cover every row, only missing values come back as -1
+                    codes = encoders[column].codes(chunk[column])
+                    values[:, i] = np.where(codes < 0, np.nan, codes)
+                else:
+                    values[:, i] = chunk[column]
+            prices = chunk['price'].to_numpy(dtype=np.float64)
+
+            # Rows with missing values are dropped, like dropna() after fit_transform()
+            complete = ~(np.isnan(values).any(axis=1) | np.isnan(prices))
+            values = values[complete]
+            prices = prices[complete]
+
+            if len(values):
+                data_min = np.minimum(data_min, values.min(axis=0))
+                data_max = np.maximum(data_max, values.max(axis=0))
+            x[n_rows:n_rows + len(values)] = values
+            y[n_rows:n_rows + len(values)] = prices
+            n_rows += len(values)
+
+            if progress is not None:
+                progress(f'Encoding rows... {n_rows} kept', n_rows / self.total_rows)
+
+        if n_rows == 0:
+            raise ValueError(f'{self.csv_path} has no rows left after outlier removal')
+
+        # MinMax parameters of the kept rows, a constant column gets scale 1 like in MinMaxScaler
+        data_range = data_max - data_min
+        scale = 1.0 / np.where(data_range == 0, 1.0, data_range)
+        self.feature_transform = FeatureTransform(self.categories, scale, -data_min * scale)
+
+        for start in range(0, n_rows, self.chunksize):
+            end = min(start + self.chunksize, n_rows)
+            block = x[start:end].astype(np.float64)
+            block *= self.feature_transform.scale
+            block += self.feature_transform.min
+            x[start:end] = block
+        x.flush()
+        y.flush()
+
+        # The files hold total_rows rows, only the first n_rows are used
+        with open(f'{self.output_dir}/{self.META_FILENAME}', 'w') as file:
+            json.dump({'csv_path': self.csv_path, 'total_rows': self.total_rows, 'n_rows': n_rows}, file, indent=2)
+
+        self.x = x[:n_rows]
+        self.y = y[:n_rows]
+        return self.x, self.y
+
+    def run(self, progress=None):
+        self.scan(progress)
+        return self.write_matrix(progress)
+
+    def filtered_sample(self):
+        # Outlier-filtered sample of the raw rows, small enough for the plot and the statistics
+        lower, upper = DFPreprocess.outlier_bounds(self.sample_df)
+        return self.sample_df[DFPreprocess.outlier_mask(self.sample_df, lower, upper)]
+
+    def save_feature_transform(self, model_dir='saved_model'):
+        self.feature_transform.save(f'{model_dir}/{FeatureTransform.FILENAME}')
+        print(f'Feature transform saved as {model_dir}/{FeatureTransform.FILENAME}')
+
+
+# Preprocess and train on a CSV file larger than memory, then publish the model:
+# python df_stream.py exports.csv --sample-size 1000000
+def main():
+    parser = argparse.ArgumentParser(description='Chunked preprocessing and training for large CSV files')
+    parser.add_argument('csv_path')
+    parser.add_argument('--output-dir', default='cache/stream', help='directory for the memory-mapped matrix')
+    parser.add_argument('--chunksize', type=int, default=100_000, help='rows read from the CSV file at a time')
+    parser.add_argument('--sketch-size', type=int, default=100_000,
+                        help='rows in the reservoir sample used for the quartiles and the plot')
+    parser.add_argument('--sample-size', type=int, default=None,
+                        help='train on a random sample of this many rows instead of the whole matrix')
+    parser.add_argument('--backend', default='random_forest', choices=['random_forest', 'hist_gradient_boosting'])
+    args = parser.parse_args()
+
+    df_stream = DFStreamPreprocess(args.csv_path, args.output_dir, args.chunksize, args.sketch_size)
+    x, y = df_stream.run()
+    print(f'{len(x)} of {df_stream.total_rows} rows written to {args.output_dir}/{df_stream.FEATURES_FILENAME}')
+
+    df_train = DFTrain.from_arrays(x, y, args.sample_size)
+    df_train.train_model(args.backend)
+    ModelRegistry().publish_bundle(df_stream, df_train)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,31 +1,292 @@
+import copy
+import os
+import pickle
+import time
+
 import joblib
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, r2_score
 from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestRegressor
+
+from compiled_forest import CompiledForest
+from model_manifest import BACKEND_FILENAMES, write_manifest
+
+
+class TrainingMetrics:
+    def __init__(self, n_estimators, fit_seconds, r2, mae, model_bytes, single_row_ms):
+        # Training cost, held-out accuracy and inference cost of one trained model
+        self.n_estimators = n_estimators
+        self.fit_seconds = fit_seconds
+        self.r2 = r2
+        self.mae = mae
+        self.model_bytes = model_bytes
+        self.single_row_ms = single_row_ms
+
+    def to_dict(self):
+        return {
+            'n_estimators': int(self.n_estimators),
+            'fit_seconds': float(self.fit_seconds),
+            'r2': float(self.r2),
+            'mae': float(self.mae),
+            'model_bytes': int(self.model_bytes),
+            'single_row_ms': float(self.single_row_ms)
+        }
+
+    def __str__(self):
+        return (f'trees {self.n_estimators}, fit {self.fit_seconds:.2f} s, R2 {self.r2:.4f}, MAE {self.mae:.1f}, '
+                f'size {self.model_bytes / 1024 ** 2:.1f} MB, single row {self.single_row_ms:.2f} ms')
+
+
+def single_row_latency_ms(model, row, repeats=50):
+    # Median latency of scoring one row, the way the GUI and the service use the model
+    timings = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter()
+        model.predict(row)
+        timings[i] = time.perf_counter() - start
+    return np.median(timings) * 1000
+
+
+def model_bytes(model):
+    return len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
 
 
 class DFTrain:
-    MODEL_FILENAME = 'random_forest_regressor_model.joblib'
+    MODEL_FILENAME = BACKEND_FILENAMES['random_forest']
 
     def __init__(self, df):
-        self.df = df.copy()
+        self.df = df.copy() if df is not None else None
+        self.x = None
+        self.y = None
+        self.backend = None
         self.rf_model = None
+        self.hgb_model = None
+        self.compiled_forest = None
+        self.x_test = None
+        self.y_test = None
+        self.fit_seconds = None
+        self.metrics = None
+
+    @staticmethod
+    def new_random_forest_regressor(n_estimators=100, n_jobs=-1, max_depth=None, min_samples_leaf=1, max_samples=None,
+                                    max_features=1.0, random_state=42, warm_start=False):
+        return RandomForestRegressor(
+            n_estimators=n_estimators,
+            n_jobs=n_jobs,
+            max_depth=max_depth,
+            min_samples_leaf=min_samples_leaf,
+            max_samples=max_samples,
+            max_features=max_features,
+            random_state=random_state,
+            warm_start=warm_start
+        )
+
+    @property
+    def model(self):
+        # The estimator of the backend that was trained last
+        if self.backend == 'hist_gradient_boosting':
+            return self.hgb_model
+        return self.rf_model
+
+    def train_model(self, backend='random_forest', **params):
+        trainers = {
+            'random_forest': self.train_random_forest_regressor,
+            'hist_gradient_boosting': self.train_hist_gradient_boosting_regressor
+        }
+        if backend not in trainers:
+            raise ValueError(f'Unknown model backend {backend}, choose one of {", ".join(trainers)}')
+        return trainers[backend](**params)
+
+    @classmethod
+    def from_arrays(cls, x, y, sample_size=None, random_state=42):
+        # Train from a feature matrix in FeatureColumns.FEATURES order, e.g. the memory-mapped
+        # output of DFStreamPreprocess, or from a bounded random sample of its rows
+        if sample_size is not None and len(x) > sample_size:
+            rows = np.sort(np.random.default_rng(random_state).choice(len(x), sample_size, replace=False))
+            x = x[rows]
+            y = y[rows]
+
+        df_train = cls(None)
+        df_train.x = x
+        df_train.y = y
+        return df_train
+
+    def split_train_test(self, test_size, random_state):
+        if self.df is None:
+            # Exports are often sorted, e.g. by brand, so the test rows are drawn at random and never
+            # by position in the file. Each index set is sorted to keep memory-mapped reads sequential
+            train_rows, test_rows = train_test_split(np.arange(len(self.x)), test_size=test_size,
+                                                     random_state=random_state)
+            train_rows.sort()
+            test_rows.sort()
+            self.x_test = self.x[test_rows]
+            self.y_test = self.y[test_rows]
+            return self.x[train_rows], self.y[train_rows]
 
-    def train_random_forest_regressor(self, test_size=0.2, random_state=42):
         x = self.df.drop('price', axis=1)
         y = self.df['price']
 
-        # Split the data into training and testing sets
-        x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=test_size, random_state=random_state)
+        # Split the data into training and testing sets, the test split is kept for evaluation
+        x_train, self.x_test, y_train, self.y_test = train_test_split(
+            x, y, test_size=test_size, random_state=random_state)
+        return x_train, y_train
+
+    def grow_forest(self, x_train, y_train, n_new_trees, batch_size, progress):
+        # Grow the forest batch by batch so progress can be reported in between,
+        # with warm_start every fit call only fits the trees added since the last call
+        if batch_size is None:
+            batch_size = max(10, os.cpu_count() or 1)
+        n_trees = self.rf_model.n_estimators + n_new_trees
+        start = time.perf_counter()
+        while self.rf_model.n_estimators < n_trees:
+            self.rf_model.set_params(n_estimators=min(self.rf_model.n_estimators + batch_size, n_trees))
+            self.rf_model.fit(x_train, y_train)
+            if progress is not None:
+                progress(n_new_trees - (n_trees - self.rf_model.n_estimators), n_new_trees)
+        self.fit_seconds = time.perf_counter() - start
+
+    def train_random_forest_regressor(self, test_size=0.2, random_state=42, n_estimators=100, n_jobs=-1,
+                                      max_depth=None, min_samples_leaf=1, max_samples=None, max_features=1.0,
+                                      batch_size=None, progress=None):
+        x_train, y_train = self.split_train_test(test_size, random_state)
+
+        # Trees are fitted in parallel on all cores (n_jobs=-1), max_samples subsamples each bootstrap
+        self.backend = 'random_forest'
+        self.rf_model = self.new_random_forest_regressor(
+            n_estimators=0,
+            n_jobs=n_jobs,
+            max_depth=max_depth,
+            min_samples_leaf=min_samples_leaf,
+            max_samples=max_samples,
+            max_features=max_features,
+            random_state=random_state,
+            warm_start=True
+        )
+
+        self.grow_forest(x_train, y_train, n_estimators, batch_size, progress)
 
-        # Train and evaluate Random Forest Regressor model
-        self.rf_model = RandomForestRegressor()
-        self.rf_model.fit(x_train, y_train)
+        # Evaluate the model on the held-out split
+        self.metrics = self.evaluate_model()
+        print(f'Random forest trained: {self.metrics}')
 
         return self.rf_model
 
-    def save_trained_model(self):
+    def train_hist_gradient_boosting_regressor(self, test_size=0.2, random_state=42, max_iter=200, learning_rate=0.1,
+                                               max_leaf_nodes=31, max_depth=None, min_samples_leaf=20, batch_size=20,
+                                               progress=None):
+        x_train, y_train = self.split_train_test(test_size, random_state)
+
+        # Histogram-based boosting bins every feature once, so each iteration is a single small tree.
+        # Early stopping is off, so max_iter is the exact number of iterations the progress reports on
+        self.backend = 'hist_gradient_boosting'
+        self.hgb_model = HistGradientBoostingRegressor(
+            max_iter=0,
+            learning_rate=learning_rate,
+            max_leaf_nodes=max_leaf_nodes,
+            max_depth=max_depth,
+            min_samples_leaf=min_samples_leaf,
+            early_stopping=False,
+            random_state=random_state,
+            warm_start=True
+        )
+
+        # Same batch loop as for the forest, warm_start continues boosting from the last iteration
+        start = time.perf_counter()
+        while self.hgb_model.max_iter < max_iter:
+            self.hgb_model.set_params(max_iter=min(self.hgb_model.max_iter + batch_size, max_iter))
+            self.hgb_model.fit(x_train, y_train)
+            if progress is not None:
+                progress(self.hgb_model.max_iter, max_iter)
+        self.fit_seconds = time.perf_counter() - start
+
+        self.metrics = self.evaluate_model()
+        print(f'Histogram gradient boosting trained: {self.metrics}')
+
+        return self.hgb_model
+
+    def append_random_forest_trees(self, rf_model, n_new_trees=20, max_trees=None, test_size=0.2, random_state=None,
+                                   batch_size=None, progress=None):
+        # self.df holds only the new rows, encoded with the feature transform of rf_model,
+        # so the cost of an update depends on the size of the new data and not on the history
+        x_train, y_train = self.split_train_test(test_size, random_state)
+
+        # Work on a copy that shares the fitted trees, the given model keeps serving predictions meanwhile
+        self.backend = 'random_forest'
+        self.rf_model = copy.copy(rf_model)
+        self.rf_model.estimators_ = list(rf_model.estimators_)
+        self.rf_model.set_params(n_estimators=len(self.rf_model.estimators_), warm_start=True,
+                                 random_state=random_state)
+
+        self.grow_forest(x_train, y_train, n_new_trees, batch_size, progress)
+
+        # Retire the oldest trees so the forest keeps a bounded size and follows recent listings
+        if max_trees is not None and len(self.rf_model.estimators_) > max_trees:
+            del self.rf_model.estimators_[:len(self.rf_model.estimators_) - max_trees]
+            self.rf_model.set_params(n_estimators=max_trees)
+
+        # Evaluate the grown model on the held-out part of the new rows
+        self.metrics = self.evaluate_model()
+        print(f'Random forest updated with {n_new_trees} trees on {len(x_train)} new rows: {self.metrics}')
+
+        return self.rf_model
+
+    def evaluate_model(self, repeats=50):
+        model = self.model
+        y_predicted = model.predict(self.x_test)
+
+        # Trees in the forest or boosting iterations
+        if self.backend == 'hist_gradient_boosting':
+            n_estimators = model.n_iter_
+        else:
+            n_estimators = len(model.estimators_)
+
+        return TrainingMetrics(
+            n_estimators=n_estimators,
+            fit_seconds=self.fit_seconds,
+            r2=r2_score(self.y_test, y_predicted),
+            mae=mean_absolute_error(self.y_test, y_predicted),
+            model_bytes=model_bytes(model),
+            single_row_ms=single_row_latency_ms(model, self.x_test[:1], repeats)
+        )
+
+    def save_trained_model(self, mmap_friendly=False, model_dir='saved_model', compress=0, float32=False,
+                           prune_depth=None):
+        if self.model:
+            if self.backend == 'random_forest' and (mmap_friendly or float32 or prune_depth is not None):
+                # sklearn copies tree nodes out of the file on load, so write the compiled
+                # node arrays instead, which joblib.load(..., mmap_mode='r') maps directly.
+                # Pruning and float32 nodes only exist for the compiled format
+                model_file = CompiledForest.FILENAME
+                model_format = 'compiled_forest'
+                self.export_compiled_forest(model_dir, compress, float32, prune_depth)
+            else:
+                model_file = BACKEND_FILENAMES[self.backend]
+                model_format = 'sklearn'
+                joblib.dump(self.model, f'{model_dir}/{model_file}', compress=compress)
+                print(f'Trained model saved as {model_dir}/{model_file} '
+                      f'({os.path.getsize(f"{model_dir}/{model_file}") / 1024 ** 2:.1f} MB)')
+
+            # Declare backend and format, so the GUI and the batch paths load the right artifact
+            write_manifest(model_dir, self.backend, model_file, model_format, compress, float32, prune_depth)
+        else:
+            print('Error: Model not trained yet. Call train_model first.')
+
+    def compile_random_forest(self):
+        # Flatten the trained forest into node arrays for sklearn-free inference
+        self.compiled_forest = CompiledForest.from_estimators(self.rf_model.estimators_)
+        return self.compiled_forest
+
+    def export_compiled_forest(self, model_dir='saved_model', compress=0, float32=False, prune_depth=None):
         if self.rf_model:
-            joblib.dump(self.rf_model, 'saved_model/' + self.MODEL_FILENAME)
-            print(f'Trained model saved as saved_model/{self.MODEL_FILENAME}')
+            compiled_forest = self.compile_random_forest()
+            if prune_depth is not None:
+                compiled_forest = compiled_forest.prune(prune_depth)
+            if float32:
+                compiled_forest = compiled_forest.downcast()
+
+            path = f'{model_dir}/{CompiledForest.FILENAME}'
+            compiled_forest.save(path, compress)
+            print(f'Compiled forest saved as {path} ({os.path.getsize(path) / 1024 ** 2:.1f} MB)')
         else:
             print('Error: Model not trained yet. Call train_random_forest_regressor first.')
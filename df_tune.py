@@ -0,0 +1,201 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from sklearn.metrics import r2_score
+from sklearn.model_selection import KFold
+
+import text_format
+from df_load import DFLoad
+from df_preprocess import DFPreprocess
+from df_train import DFTrain, model_bytes, single_row_latency_ms
+from features import FeatureColumns
+from model_registry import ModelRegistry
+from preprocess_cache import PreprocessCache
+
+text_format = text_format.TextFormat
+
+SEARCH_SPACE = {
+    'n_estimators': [50, 100, 200],
+    'max_depth': [None, 10, 20, 30],
+    'min_samples_leaf': [1, 2, 4, 8],
+    'max_features': [1.0, 0.7, 0.5, 'sqrt']
+}
+
+
+def run_trial(x_path, y_path, rows, params, folds, random_state):
+    # Runs in a pool worker, the matrices are memory-mapped so all workers share the same pages
+    # instead of each receiving a pickled copy
+    x = np.load(x_path, mmap_mode='r')[:rows]
+    y = np.load(y_path, mmap_mode='r')[:rows]
+
+    scores = []
+    fit_seconds = 0.0
+    for train_index, test_index in KFold(folds).split(x):
+        # One process per trial already keeps every core busy, so each forest fits single-threaded
+        model = DFTrain.new_random_forest_regressor(n_jobs=1, random_state=random_state, **params)
+        start = time.perf_counter()
+        model.fit(x[train_index], y[train_index])
+        fit_seconds += time.perf_counter() - start
+        scores.append(r2_score(y[test_index], model.predict(x[test_index])))
+
+    return {
+        'cv_r2': float(np.mean(scores)),
+        'fit_seconds': fit_seconds / folds,
+        'predict_ms': float(single_row_latency_ms(model, x[:1])),
+        'model_bytes': model_bytes(model)
+    }
+
+
+def trial_key(rows, params):
+    return rows, json.dumps(params, sort_keys=True)
+
+
+class DFTune:
+    DIRECTORY = 'cache/tune'
+
+    def __init__(self, csv_path, log_path, n_candidates=16, min_rows=2000, factor=3, folds=3, workers=None,
+                 random_state=42):
+        self.csv_path = csv_path
+        self.log_path = log_path
+        self.n_candidates = n_candidates
+        self.min_rows = min_rows
+        self.factor = factor
+        self.folds = folds
+        self.workers = workers or os.cpu_count()
+        self.random_state = random_state
+
+        self.df_preprocess = None
+        self.train_df = None
+        self.data_key = None
+        self.x_path = None
+        self.y_path = None
+        self.n_rows = None
+
+        # Finished trials of this dataset by (rows, params), read back from the log when resuming
+        self.trials = {}
+
+    def prepare_data(self):
+        self.df_preprocess = DFPreprocess(DFLoad(self.csv_path).load())
+        self.df_preprocess.remove_outliers()
+        preprocess_key = PreprocessCache.key(self.csv_path, self.df_preprocess.cache_params())
+        self.train_df = self.df_preprocess.fit_transform_cached(PreprocessCache(), preprocess_key).dropna()
+
+        # Trials are only comparable on the same data in the same shuffled order
+        self.data_key = f'{preprocess_key[:16]}-{self.random_state}'
+        self.x_path = f'{self.DIRECTORY}/{self.data_key}_x.npy'
+        self.y_path = f'{self.DIRECTORY}/{self.data_key}_y.npy'
+        self.n_rows = len(self.train_df)
+
+        if not (os.path.exists(self.x_path) and os.path.exists(self.y_path)):
+            # Shuffle once, so the first n rows are a random sample for every rung budget.
+            # float32 is what the trees train on, so workers can use the mapped pages without a conversion copy
+            order = np.random.default_rng(self.random_state).permutation(self.n_rows)
+            os.makedirs(self.DIRECTORY, exist_ok=True)
+            np.save(self.x_path, self.train_df[FeatureColumns.FEATURES].to_numpy(dtype=np.float32)[order])
+            np.save(self.y_path, self.train_df['price'].to_numpy(dtype=np.float64)[order])
+
+    def load_log(self):
+        if not os.path.exists(self.log_path):
+            return
+
+        with open(self.log_path) as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record['data'] == self.data_key:
+                    self.trials[trial_key(record['rows'], record['params'])] = record
+
+        print(f'Resuming with {len(self.trials)} finished trials from {self.log_path}')
+
+    def sample_candidates(self):
+        # Seeded, so an interrupted search samples the same candidates when it is resumed
+        combinations = list(itertools.product(*SEARCH_SPACE.values()))
+        sampled = random.Random(self.random_state).sample(combinations, min(self.n_candidates, len(combinations)))
+        return [dict(zip(SEARCH_SPACE.keys(), values)) for values in sampled]
+
+    def run_rung(self, pool, candidates, rows):
+        futures = {}
+        for params in candidates:
+            if trial_key(rows, params) not in self.trials:
+                future = pool.submit(run_trial, self.x_path, self.y_path, rows, params, self.folds, self.random_state)
+                futures[future] = params
+
+        for future in as_completed(futures):
+            record = {'data': self.data_key, 'rows': rows, 'params': futures[future]}
+            record.update(future.result())
+            self.trials[trial_key(rows, record['params'])] = record
+
+            # Append every trial as soon as it finishes, an interrupted search loses only the running ones
+            with open(self.log_path, 'a') as file:
+                file.write(json.dumps(record) + '\n')
+
+        records = [self.trials[trial_key(rows, params)] for params in candidates]
+        return sorted(records, key=lambda record: record['cv_r2'], reverse=True)
+
+    def search(self):
+        self.prepare_data()
+        self.load_log()
+
+        candidates = self.sample_candidates()
+        rows = self.min_rows
+        with ProcessPoolExecutor(self.workers) as pool:
+            while True:
+                rows = min(rows, self.n_rows)
+                records = self.run_rung(pool, candidates, rows)
+                self.print_rung(records, rows)
+
+                # Stop at one survivor or once the whole dataset is the budget
+                if len(records) == 1 or rows == self.n_rows:
+                    break
+
+                # Keep the best 1/factor of the candidates and give them factor times more rows
+                survivors = records[:max(1, len(records) // self.factor)]
+                candidates = [record['params'] for record in survivors]
+                rows *= self.factor
+
+        return records[0]
+
+    def print_rung(self, records, rows):
+        title = f'{len(records)} candidates on {rows} rows, {self.folds}-fold CV'
+        print(f"\n{text_format.BOLD}{title}{text_format.RESET}\n")
+        print(f'{"R2":>7} {"fit s":>7} {"row ms":>7} {"MB":>7}  params')
+        for record in records:
+            print(f'{record["cv_r2"]:>7.4f} {record["fit_seconds"]:>7.2f} {record["predict_ms"]:>7.2f} '
+                  f'{record["model_bytes"] / 1024 ** 2:>7.1f}  {record["params"]}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Successive halving search over random forest settings')
+    parser.add_argument('--csv', default='csv/cars.csv', help='dataset to tune on')
+    parser.add_argument('--log', default='saved_model/tuning_trials.jsonl',
+                        help='JSONL file with one line per finished trial, reused to resume a search')
+    parser.add_argument('--candidates', type=int, default=16, help='number of sampled settings in the first rung')
+    parser.add_argument('--min-rows', type=int, default=2000, help='training rows per candidate in the first rung')
+    parser.add_argument('--factor', type=int, default=3, help='keep 1/factor of the candidates per rung')
+    parser.add_argument('--folds', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, all cores by default')
+    parser.add_argument('--random-state', type=int, default=42)
+    parser.add_argument('--train-best', action='store_true',
+                        help='train the winning setting on the full dataset and publish it as a new model version')
+    args = parser.parse_args()
+
+    df_tune = DFTune(args.csv, args.log, args.candidates, args.min_rows, args.factor, args.folds, args.workers,
+                     args.random_state)
+    best = df_tune.search()
+    print(f"\n{text_format.BOLD}Best setting:{text_format.RESET} {best['params']} (CV R2 {best['cv_r2']:.4f})")
+
+    if args.train_best:
+        df_train = DFTrain(df_tune.train_df)
+        df_train.train_random_forest_regressor(random_state=args.random_state, **best['params'])
+        ModelRegistry().publish_bundle(df_tune.df_preprocess, df_train)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import os
+
+import joblib
+import numpy as np
+
+from category_encoder import CategoryEncoder
+from features import FeatureColumns
+
+
+class FeatureTransform:
+    FILENAME = 'feature_transform.joblib'
+
+    def __init__(self, categories, scale, min_):
+        # Category lists per categorical column, position in the list is the encoded value
+        self.categories = {column: list(categories[column]) for column in FeatureColumns.CATEGORICAL}
+
+        # Per-column MinMax parameters in FeatureColumns.FEATURES order
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.min = np.asarray(min_, dtype=np.float64)
+
+        # Hash-based category -> code encoders, built once. Unseen categories get each encoder's reserved code
+        self.encoders = {column: CategoryEncoder(self.categories[column]) for column in FeatureColumns.CATEGORICAL}
+
+    @classmethod
+    def from_fitted(cls, category_encoders, scalers):
+        # Fuse fitted CategoryEncoders and MinMaxScalers into a single transform
+        categories = {column: category_encoders[column].classes for column in FeatureColumns.CATEGORICAL}
+        scale = [scalers[column].scale_[0] for column in FeatureColumns.FEATURES]
+        min_ = [scalers[column].min_[0] for column in FeatureColumns.FEATURES]
+        return cls(categories, scale, min_)
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        state = joblib.load(path, mmap_mode=mmap_mode)
+        return cls(state['categories'], state['scale'], state['min'])
+
+    @classmethod
+    def load_legacy(cls, model_dir):
+        # Read the old layout of one joblib file per label encoder and per scaler
+        category_encoders = {}
+        for column in FeatureColumns.CATEGORICAL:
+            label_encoder = joblib.load(f'{model_dir}/label_encoder/{column}_label_encoder_model.joblib')
+            category_encoders[column] = CategoryEncoder.from_label_encoder(label_encoder)
+
+        scalers = {}
+        for column in FeatureColumns.FEATURES:
+            scalers[column] = joblib.load(f'{model_dir}/scaler/{column}_scaler_model.joblib')
+
+        return cls.from_fitted(category_encoders, scalers)
+
+    @classmethod
+    def load_from_dir(cls, model_dir, mmap_mode=None):
+        # Prefer the fused artifact and fall back to the per-file layout
+        path = f'{model_dir}/{cls.FILENAME}'
+        if os.path.exists(path):
+            return cls.load(path, mmap_mode)
+        return cls.load_legacy(model_dir)
+
+    def save(self, path):
+        state = {
+            'categories': self.categories,
+            'scale': self.scale,
+            'min': self.min
+        }
+        joblib.dump(state, path)
+
+    def encode_column(self, column, values):
+        return self.encoders[column].transform(values)
+
+    def known_rows(self, df):
+        # Mask of the rows whose categorical values all have a code in this transform
+        known = np.ones(len(df), dtype=bool)
+        for column in FeatureColumns.CATEGORICAL:
+            known &= self.encoders[column].known(df[column])
+        return known
+
+    def transform(self, df):
+        # Encode every column of the batch at once and collect it into the feature matrix
+        x = np.empty((len(df), len(FeatureColumns.FEATURES)), dtype=np.float64)
+        for i, column in enumerate(FeatureColumns.FEATURES):
+            if column in self.encoders:
+                x[:, i] = self.encode_column(column, df[column])
+            else:
+                x[:, i] = df[column]
+
+        # Apply all MinMax scalers in a single vectorized affine transform
+        x *= self.scale
+        x += self.min
+
+        return x
@@ -0,0 +1,25 @@
+# Column layout shared by preprocessing, training and prediction
+class FeatureColumns:
+    # String columns that are label encoded before scaling
+    CATEGORICAL = [
+        'brand',
+        'model',
+        'transmission',
+        'fuelType'
+    ]
+
+    # Model input columns in the order the regressor was trained on
+    FEATURES = [
+        'brand',
+        'model',
+        'year',
+        'transmission',
+        'mileage',
+        'fuelType',
+        'tax',
+        'mpg',
+        'engineSize'
+    ]
+
+    # Target column, never scaled
+    TARGET = 'price'
@@ -1,23 +1,24 @@
 import os
 import sys
+import time
+
+# Taken before the remaining imports so the first paint report covers them
+START_TIME = time.perf_counter()
 
-import joblib
 import pandas as pd
-import seaborn as sns
 
-from PyQt6.QtCore import (QCoreApplication, QMetaObject, QRect, Qt)
+from PyQt6.QtCore import (QCoreApplication, QMetaObject, QRect, Qt, QThreadPool, QTimer)
 from PyQt6.QtGui import (QBrush, QColor, QFont, QPalette, QIntValidator, QAction, QIcon, QValidator)
 from PyQt6.QtWidgets import (QApplication, QComboBox, QDial, QMainWindow,
                              QHBoxLayout, QLabel, QLineEdit,
                              QPushButton, QRadioButton, QSlider,
-                             QVBoxLayout, QWidget, QSizePolicy, QFileDialog)
-
-from matplotlib import pyplot as plt
-from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg, NavigationToolbar2QT
+                             QVBoxLayout, QWidget, QSizePolicy, QFileDialog, QProgressBar)
 
-from df_analyze import DFAnalyze
-from df_preprocess import DFPreprocess
-from df_train import DFTrain
+from aggregate_cube import AggregateCube
+from model_registry import ModelRegistry, resolve_model_dir
+from running_aggregates import RunningAggregates
+from ui_workers import (AppendTrainWorker, ModelReloadWorker, PipelineResult, PredictionWorker, RetrainWorker,
+                        StartupWorker)
 
 
 class CustomValidator(QValidator):
@@ -35,68 +36,37 @@ class CustomValidator(QValidator):
 
 
 class UICarPricePredictionDialog(QMainWindow):
-    def __init__(self, df):
+    def __init__(self, csv_path='csv/cars.csv', model_dir='default_model'):
         super().__init__()
 
-        # Load various machine learning, scaler and label encoder models
-
-        # Load the saved random forest model
-        self.random_forest_model_filename = 'random_forest_regressor_model.joblib'
-        self.random_forest_model = joblib.load('default_model/' + self.random_forest_model_filename)
-
-        # Load the brand scaler model
-        self.brand_scaler_model_filename = 'brand_scaler_model.joblib'
-        self.brand_scaler_model = joblib.load('default_model/scaler/' + self.brand_scaler_model_filename)
-
-        # Load the model scaler model
-        self.model_scaler_model_filename = 'model_scaler_model.joblib'
-        self.loaded_model_scaler_model = joblib.load('default_model/scaler/' + self.model_scaler_model_filename)
-
-        # Load the year scaler model
-        self.year_scaler_model_filename = 'year_scaler_model.joblib'
-        self.year_scaler_model = joblib.load('default_model/scaler/' + self.year_scaler_model_filename)
-
-        # Load the transmission scaler model
-        self.transmission_scaler_model_filename = 'transmission_scaler_model.joblib'
-        self.transmission_scaler_model = joblib.load('default_model/scaler/' + self.transmission_scaler_model_filename)
-
-        # Load the mileage scaler model
-        self.mileage_scaler_model_filename = 'mileage_scaler_model.joblib'
-        self.mileage_scaler_model = joblib.load('default_model/scaler/' + self.mileage_scaler_model_filename)
-
-        # Load the fuelType scaler model
-        self.fuelType_scaler_model_filename = 'fuelType_scaler_model.joblib'
-        self.fuelType_scaler_model = joblib.load('default_model/scaler/' + self.fuelType_scaler_model_filename)
-
-        # Load the tax scaler model
-        self.tax_scaler_model_filename = 'tax_scaler_model.joblib'
-        self.tax_scaler_model = joblib.load('default_model/scaler/' + self.tax_scaler_model_filename)
-
-        # Load the mpg scaler model
-        self.mpg_scaler_model_filename = 'mpg_scaler_model.joblib'
-        self.mpg_scaler_model = joblib.load('default_model/scaler/' + self.mpg_scaler_model_filename)
-
-        # Load the engineSize scaler model
-        self.engineSize_scaler_model_filename = 'engineSize_scaler_model.joblib'
-        self.engineSize_scaler_model = joblib.load('default_model/scaler/' + self.engineSize_scaler_model_filename)
-
-        # Load the brand label encoder model
-        self.brand_label_encoder_model_filename = 'brand_label_encoder_model.joblib'
-        self.brand_label_encoder = joblib.load('default_model/label_encoder/' + self.brand_label_encoder_model_filename)
-
-        # Load the model label encoder model
-        self.model_label_encoder_model_filename = 'model_label_encoder_model.joblib'
-        self.model_label_encoder = joblib.load('default_model/label_encoder/' + self.model_label_encoder_model_filename)
-
-        # Load the transmission label encoder model
-        self.transmission_label_encoder_model_filename = 'transmission_label_encoder_model.joblib'
-        self.transmission_label_encoder = joblib.load(
-            'default_model/label_encoder/' + self.transmission_label_encoder_model_filename)
-
-        # Load the fuel type label encoder model
-        self.fuelType_label_encoder_model_filename = 'fuelType_label_encoder_model.joblib'
-        self.fuelType_label_encoder = joblib.load(
-            'default_model/label_encoder/' + self.fuelType_label_encoder_model_filename)
+        # The data and the model are loaded in the background after the window is shown
+        self.csv_path = csv_path
+        self.model_dir = model_dir
+        self.df = None
+        self.predictor = None
+        self.retrain_worker = None
+        self.first_paint_time = None
+
+        # Hot reload: poll the registry pointer and load a newly published model version in the background
+        self.model_version = None
+        self.model_reload_worker = None
+        self.model_reload_timer = QTimer(self)
+        self.model_reload_timer.setInterval(2000)
+        self.model_reload_timer.timeout.connect(self.check_for_new_model)
+
+        # Live prediction: debounce input changes and drop results of outdated inputs
+        self.live_generation = 0
+        self.live_prediction_timer = QTimer(self)
+        self.live_prediction_timer.setSingleShot(True)
+        self.live_prediction_timer.setInterval(150)
+        self.live_prediction_timer.timeout.connect(self.start_live_prediction)
+
+        # Statistics panel: kept up to date as rows come and go, the labels change only with their values
+        self.aggregates = RunningAggregates()
+        self.aggregates.subscribe(self.on_aggregate_changed)
+
+        # Count, sums and sums of squares per brand, model, year and fuel type for the slice statistics
+        self.cube = None
 
         # Initialize variables and UI elements
 
@@ -109,18 +79,12 @@ class UICarPricePredictionDialog(QMainWindow):
         # Index to track the current variable being displayed
         self.current_variable_index = 0
 
-        # Analyze the input DataFrame
-        self.df_analyze = DFAnalyze(df).analyze()
-
-        # Preprocess the input DataFrame by removing outliers
-        self.df = DFPreprocess(df).remove_outliers()
-
         # Set object name for the dialog (if not already set)
         if not self.objectName():
             self.setObjectName(u"carPricePredictionDialog")
 
-        # Resize the dialog to a default size of 800x600
-        self.resize(800, 600)
+        # Resize the dialog to a default size of 800x620
+        self.resize(800, 620)
 
         # Initialize UI elements (layout, labels, buttons, etc.)
         # Note: These elements are currently set to None and will be assigned during setup_ui()
@@ -174,6 +138,7 @@ class UICarPricePredictionDialog(QMainWindow):
         self.scatterMainLayout = None
         self.scatter_fig = None
         self.scatter_plot = None
+        self.scatter_view = None
         self.scatter_canvas = None
         self.scatter_layout = None
         self.metricsMainLayout = None
@@ -190,17 +155,27 @@ class UICarPricePredictionDialog(QMainWindow):
         self.predictedPriceHorizontalLayout = None
         self.predictedPriceLabel = None
         self.predictedPriceNumberLabel = None
+        self.predictedPriceRangeLabel = None
+        self.sliceStatsLabel = None
         self.mpgDescription = None
         self.taxDescription = None
         self.predictPriceButton = None
         self.predicted_price = None
+        self.predicted_interval = None
+        self.interval_quantiles = (0.1, 0.9)
         self.toolbar = None
+        self.loadingProgressBar = None
+        self.import_csv_file_action = None
+        self.append_csv_file_action = None
+        self.cancel_retraining_action = None
+        self.rollback_model_action = None
+        self.liveUpdateAction = None
 
         # Setup UI elements
         self.setup_ui()
 
-        # Update statistics
-        self.update_stats()
+        # Load the CSV file, analysis and model artifacts off the UI thread
+        self.start_background_loading()
 
     def setup_ui(self):
         # Set color palette
@@ -242,14 +217,37 @@ class UICarPricePredictionDialog(QMainWindow):
         file_menu = menubar.addMenu("File")
 
         # Create "Import CSV File" action
-        import_csv_file_action = QAction("Import CSV File", self)
+        self.import_csv_file_action = QAction("Import CSV File", self)
         # Set icon for the action
         import_csv_file_img_path = os.path.join(os.path.dirname(__file__), 'img/import_csv_file_action_img.png')
-        import_csv_file_action.setIcon(QIcon(import_csv_file_img_path))
+        self.import_csv_file_action.setIcon(QIcon(import_csv_file_img_path))
         # Connect Import CSV File action signal to a custom slot
-        import_csv_file_action.triggered.connect(self.import_csv_file)
+        self.import_csv_file_action.triggered.connect(self.import_csv_file)
         # Add open action to file_menu
-        file_menu.addAction(import_csv_file_action)
+        file_menu.addAction(self.import_csv_file_action)
+
+        # Create "Append CSV File" action, grows the current model with trees fitted on the new rows only
+        self.append_csv_file_action = QAction("Append CSV File", self)
+        self.append_csv_file_action.triggered.connect(self.append_csv_file)
+        file_menu.addAction(self.append_csv_file_action)
+
+        # Create "Cancel Retraining" action, only enabled while a retrain is running
+        self.cancel_retraining_action = QAction("Cancel Retraining", self)
+        self.cancel_retraining_action.setEnabled(False)
+        self.cancel_retraining_action.triggered.connect(self.cancel_retraining)
+        file_menu.addAction(self.cancel_retraining_action)
+
+        # Create "Roll Back Model" action, makes the previously published model version current again
+        self.rollback_model_action = QAction("Roll Back Model", self)
+        self.rollback_model_action.triggered.connect(self.rollback_model)
+        file_menu.addAction(self.rollback_model_action)
+
+        # Create a Prediction menu with the opt-in live prediction mode
+        prediction_menu = menubar.addMenu("Prediction")
+        self.liveUpdateAction = QAction("Live Prediction", self)
+        self.liveUpdateAction.setCheckable(True)
+        self.liveUpdateAction.toggled.connect(self.on_live_prediction_toggled)
+        prediction_menu.addAction(self.liveUpdateAction)
 
         # Create options main vertical layout
         self.optionsMainLayout = QWidget(self)
@@ -656,30 +654,7 @@ class UICarPricePredictionDialog(QMainWindow):
 
         self.scatterMainLayout = QVBoxLayout(self.carPriceGraphicsView)
 
-        # Select 100 random rows from your DataFrame
-        self.random_sample_df = self.df.sample(n=100, random_state=42)
-
-        # Create a scatter plot for year vs. price
-        self.scatter_fig, ax = plt.subplots()
-        self.scatter_plot = sns.scatterplot(data=self.random_sample_df, y="price", x="year", ax=ax)
-        self.scatter_plot.set_title("Scatter Plot: Price vs. Year")
-
-        # Customize xlabel and ylabel appearance
-        self.scatter_plot.set_xlabel("Year", fontsize=12, labelpad=5)
-        self.scatter_plot.set_ylabel("Price", fontsize=12, labelpad=5)
-
-        self.scatter_canvas = FigureCanvasQTAgg(self.scatter_fig)
-
-        self.scatter_layout = QVBoxLayout()
-        self.scatter_layout.addWidget(self.scatter_canvas)
-
-        self.scatter_fig.tight_layout(pad=2)
-
-        # Add a toolbar to the scatter canvas
-        self.toolbar = NavigationToolbar2QT(self.scatter_canvas, self)
-        self.scatterMainLayout.addWidget(self.toolbar)
-
-        self.scatterMainLayout.addLayout(self.scatter_layout)
+        # The scatter plot itself is created by setup_plot() once the data is loaded
 
         # Initialize the index to 0
         self.current_variable_index = 0
@@ -797,6 +772,19 @@ class UICarPricePredictionDialog(QMainWindow):
         # Add predicted price number label to predicted price horizontal layout
         self.predictedPriceHorizontalLayout.addWidget(self.predictedPriceNumberLabel)
 
+        # Create predicted price range label, the spread of the individual tree predictions
+        self.predictedPriceRangeLabel = QLabel(self)
+        self.predictedPriceRangeLabel.setObjectName(u"predictedPriceRangeLabel")
+        self.predictedPriceRangeLabel.setGeometry(QRect(520, 572, 221, 21))
+        self.predictedPriceRangeLabel.setFont(default_description_font)
+        self.predictedPriceRangeLabel.setAlignment(Qt.AlignmentFlag.AlignCenter)
+
+        # Create slice statistics label, count and averages of the listings matching the selection
+        self.sliceStatsLabel = QLabel(self)
+        self.sliceStatsLabel.setObjectName(u"sliceStatsLabel")
+        self.sliceStatsLabel.setGeometry(QRect(30, 574, 480, 21))
+        self.sliceStatsLabel.setFont(default_description_font)
+
         # Create mpg description label
         self.mpgDescription = QLabel(self)
         self.mpgDescription.setObjectName(u"mpgDescription")
@@ -817,14 +805,111 @@ class UICarPricePredictionDialog(QMainWindow):
         self.predictPriceButton.setFlat(False)
         self.predictPriceButton.setDefault(False)
 
+        # Predictions are only possible after the model has been loaded
+        self.predictPriceButton.setEnabled(False)
+
         # Connect the button's clicked signal to a custom slot
         self.predictPriceButton.clicked.connect(self.on_predict_price_button_clicked)
 
+        # Create the loading progress bar in the status bar
+        self.loadingProgressBar = QProgressBar(self)
+        self.loadingProgressBar.setObjectName(u"loadingProgressBar")
+        self.loadingProgressBar.setRange(0, 100)
+        self.loadingProgressBar.setMaximumWidth(200)
+        self.statusBar().addPermanentWidget(self.loadingProgressBar)
+
+        # Any input change schedules a live prediction when the live mode is on
+        self.brandComboBox.currentIndexChanged.connect(self.schedule_live_prediction)
+        self.modelComboBox.currentIndexChanged.connect(self.schedule_live_prediction)
+        self.fuelTypeComboBox.currentIndexChanged.connect(self.schedule_live_prediction)
+        self.mileageLineEdit.textChanged.connect(self.schedule_live_prediction)
+        self.engineSizeLineEdit.textChanged.connect(self.schedule_live_prediction)
+        self.manualRadioButton.toggled.connect(self.schedule_live_prediction)
+        self.autoRadioButton.toggled.connect(self.schedule_live_prediction)
+        self.semiAutoRadioButton.toggled.connect(self.schedule_live_prediction)
+        self.otherRadioButton.toggled.connect(self.schedule_live_prediction)
+        self.mpgDial.valueChanged.connect(self.schedule_live_prediction)
+        self.taxDial.valueChanged.connect(self.schedule_live_prediction)
+        self.yearSlider.valueChanged.connect(self.schedule_live_prediction)
+
+        # The slice statistics follow the selected brand, model, fuel type and year
+        self.brandComboBox.currentIndexChanged.connect(self.update_slice_stats)
+        self.modelComboBox.currentIndexChanged.connect(self.update_slice_stats)
+        self.fuelTypeComboBox.currentIndexChanged.connect(self.update_slice_stats)
+        self.yearSlider.valueChanged.connect(self.update_slice_stats)
+
         # Update the user interface elements with translated text based on the current language.
         self.retranslate_ui(self)
         # Connect signals to slots based on the object names in the UI file.
         QMetaObject.connectSlotsByName(self)
 
+    def setup_plot(self):
+        # matplotlib is imported on first use, it is slow to import
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg, NavigationToolbar2QT
+        from scatter_plot_view import ScatterPlotView
+
+        # Select 100 random rows from your DataFrame
+        self.random_sample_df = self.df.sample(n=min(100, len(self.df)), random_state=42)
+
+        # Create the scatter plot with the points of every variable, starting with year vs. price
+        self.scatter_fig = Figure()
+        self.scatter_plot = self.scatter_fig.add_subplot()
+        self.scatter_view = ScatterPlotView(self.scatter_plot, self.random_sample_df, self.numeric_columns)
+        self.scatter_view.show("year")
+
+        self.scatter_canvas = FigureCanvasQTAgg(self.scatter_fig)
+
+        self.scatter_layout = QVBoxLayout()
+        self.scatter_layout.addWidget(self.scatter_canvas)
+
+        self.scatter_fig.tight_layout(pad=2)
+
+        # Add a toolbar to the scatter canvas
+        self.toolbar = NavigationToolbar2QT(self.scatter_canvas, self)
+        self.scatterMainLayout.addWidget(self.toolbar)
+
+        self.scatterMainLayout.addLayout(self.scatter_layout)
+
+    def start_background_loading(self):
+        worker = StartupWorker(self.csv_path, self.model_dir)
+        worker.signals.progress.connect(self.on_loading_progress)
+        worker.signals.finished.connect(self.on_startup_loaded)
+        worker.signals.failed.connect(self.on_loading_failed)
+        QThreadPool.globalInstance().start(worker)
+
+    def on_loading_progress(self, stage, percent):
+        self.statusBar().showMessage(stage)
+        self.loadingProgressBar.setValue(percent)
+
+    def on_startup_loaded(self, result):
+        self.df = result.df
+        self.predictor = result.predictor
+        self.model_version = result.version
+        self.model_reload_timer.start()
+
+        # Draw the plot and the statistics, then allow predictions
+        self.setup_plot()
+        self.aggregates.reset(self.df)
+        self.cube = AggregateCube.from_frame(self.df)
+        self.update_slice_stats()
+        self.predictPriceButton.setEnabled(True)
+        self.loadingProgressBar.hide()
+        print(f"Time to ready: {(time.perf_counter() - START_TIME) * 1000:.0f} ms")
+
+    def on_loading_failed(self, message):
+        self.statusBar().showMessage(message)
+        self.loadingProgressBar.hide()
+        print(message)
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+
+        # Report how long it took until the window was first painted
+        if self.first_paint_time is None:
+            self.first_paint_time = time.perf_counter()
+            print(f"Time to first paint: {(self.first_paint_time - START_TIME) * 1000:.0f} ms")
+
     # This function is responsible for translating the UI elements to the desired language.
     # It sets the text for various labels, combo boxes, line edits, and buttons in the UI.
     def retranslate_ui(self, car_price_prediction_dialog):
@@ -1029,30 +1114,47 @@ class UICarPricePredictionDialog(QMainWindow):
     def update_year_number_label(self, value):
         self.yearNumberLabel.setText(str(value))
 
-    def update_top_model_result_label(self):
-        # Get the top 1 most popular model
-        most_popular_model = self.df['model'].value_counts().idxmax()
-        self.topModelResultLabel.setText(str(most_popular_model))
-
-    def update_average_mileage_result_label(self):
-        # Calculate average mileage
-        average_mileage = self.df['mileage'].mean()
-        self.avgMileageResultLabel.setText(str(int(average_mileage)))
-
-    def update_average_mpg_result_label(self):
-        # Calculate average MPG
-        average_mpg = self.df['mpg'].mean()
-        self.avgMPGResultLabel.setText(str(int(average_mpg)))
-
-    def update_stats(self):
-        self.update_top_model_result_label()
-        self.update_average_mileage_result_label()
-        self.update_average_mpg_result_label()
-
-    # This function is called when the "Predict price" button is clicked.
-    # It gathers values from various UI elements (brand, model, fuel type, mileage, transmission, dials, sliders),
-    # and prints these values for demonstration purposes.
-    def on_predict_price_button_clicked(self):
+    # Called by the running aggregates when the top model or a rounded average has changed
+    def on_aggregate_changed(self, name, value):
+        labels = {
+            'top_model': self.topModelResultLabel,
+            'average_mileage': self.avgMileageResultLabel,
+            'average_mpg': self.avgMPGResultLabel
+        }
+        labels[name].setText('' if value is None else str(value))
+
+    def update_slice_stats(self, *args):
+        if self.cube is None:
+            return
+
+        # The exact selection first, then roll up year, fuel type and model until there are listings
+        selection = {
+            'brand': self.brandComboBox.currentText(),
+            'model': self.modelComboBox.currentText(),
+            'fuelType': self.fuelTypeComboBox.currentText(),
+            'year': self.yearSlider.value()
+        }
+        for rolled_up in ([], ['year'], ['year', 'fuelType'], ['year', 'fuelType', 'model']):
+            query = {name: value for name, value in selection.items() if name not in rolled_up}
+            stats = self.cube.query(**query)
+            if stats['count'] > 0:
+                break
+        else:
+            self.sliceStatsLabel.setText(f"No listings for {selection['brand']}")
+            return
+
+        # Rolling up a dimension also rolls up the ones before it, naming the last one is enough
+        description = ' '.join(str(value) for value in query.values())
+        if rolled_up:
+            description += {'year': ' (all years)', 'fuelType': ' (all fuel types)', 'model': ' (all models)'}[
+                rolled_up[-1]]
+        self.sliceStatsLabel.setText(
+            f"{description}: {stats['count']} cars, avg price {stats['mean']['price']:.0f}, "
+            f"avg {stats['mean']['mileage']:.0f} mi")
+
+    # This function gathers values from various UI elements (brand, model, fuel type, mileage, transmission,
+    # dials, sliders) and returns them as a one-row frame for the predictor.
+    def collect_input_frame(self):
         # Get values from various UI elements
         brand_value = self.brandComboBox.currentText()
         model_value = self.modelComboBox.currentText()
@@ -1083,54 +1185,88 @@ class UICarPricePredictionDialog(QMainWindow):
         tax_value = self.taxDial.value()
         year_value = self.yearSlider.value()
 
+        # Build a one-row frame and run it through the same path as batch scoring
+        return pd.DataFrame({
+            'brand': [brand_value],
+            'model': [model_value],
+            'year': [year_value],
+            'transmission': [transmission_value],
+            'mileage': [int(mileage_value)],
+            'fuelType': [fuel_type_value],
+            'tax': [tax_value],
+            'mpg': [mpg_value],
+            'engineSize': [float(engine_size_value)]
+        })
+
+    # This function is called when the "Predict price" button is clicked.
+    # It prints the gathered input values for demonstration purposes and shows the prediction.
+    def on_predict_price_button_clicked(self):
+        input_df = self.collect_input_frame()
+
         # Print gathered values
-        print("Brand:", brand_value)
-        print("Model:", model_value)
-        print("Fuel Type:", fuel_type_value)
-        print("Mileage:", mileage_value)
-        print("Engine Size:", engine_size_value)
-        print("Transmission:", transmission_value)
-        print("MPG Dial Value:", mpg_value)
-        print("Tax Dial Value:", tax_value)
-        print("Year Of Production Value:", year_value)
-
-        # Encode the string values using the loaded encoding models
-        encoded_brand_value = self.brand_label_encoder.transform([brand_value])[0]
-        encoded_model_value = self.model_label_encoder.transform([model_value])[0]
-        encoded_transmission_value = self.transmission_label_encoder.transform([transmission_value])[0]
-        encoded_fuel_type_value = self.fuelType_label_encoder.transform([fuel_type_value])[0]
-
-        # Transform the values using the loaded scaler models
-        transformed_brand_value = self.brand_scaler_model.transform([[encoded_brand_value]])
-        transformed_model_value = self.loaded_model_scaler_model.transform([[encoded_model_value]])
-        transformed_year_value = self.year_scaler_model.transform([[year_value]])
-        transformed_transmission_value = self.transmission_scaler_model.transform([[encoded_transmission_value]])
-        transformed_mileage_value = self.mileage_scaler_model.transform([[mileage_value]])
-        transformed_fuel_type_value = self.fuelType_scaler_model.transform([[encoded_fuel_type_value]])
-        transformed_tax_value_value = self.tax_scaler_model.transform([[tax_value]])
-        transformed_mpg_value = self.mpg_scaler_model.transform([[mpg_value]])
-        transformed_engine_size_value = self.engineSize_scaler_model.transform([[engine_size_value]])
-
-        # Create a list of transformed values
-        scaled_new_value = ([[
-            transformed_brand_value[0][0],
-            transformed_model_value[0][0],
-            transformed_year_value[0][0],
-            transformed_transmission_value[0][0],
-            transformed_mileage_value[0][0],
-            transformed_fuel_type_value[0][0],
-            transformed_tax_value_value[0][0],
-            transformed_mpg_value[0][0],
-            transformed_engine_size_value[0][0]
-        ]])
-        # Get a prediction from a model
-        prediction = self.random_forest_model.predict(scaled_new_value)
+        print("Brand:", input_df.at[0, 'brand'])
+        print("Model:", input_df.at[0, 'model'])
+        print("Fuel Type:", input_df.at[0, 'fuelType'])
+        print("Mileage:", input_df.at[0, 'mileage'])
+        print("Engine Size:", input_df.at[0, 'engineSize'])
+        print("Transmission:", input_df.at[0, 'transmission'])
+        print("MPG Dial Value:", input_df.at[0, 'mpg'])
+        print("Tax Dial Value:", input_df.at[0, 'tax'])
+        print("Year Of Production Value:", input_df.at[0, 'year'])
+
+        # Get a prediction and its interval from a model
+        prediction = self.predictor.predict_price_frame(input_df, self.interval_quantiles, use_cache=True)
+        self.show_prediction(prediction.iloc[0])
+
+    def show_prediction(self, prediction):
         # Set the predicted price on the predicted price number label
-        self.predictedPriceNumberLabel.setText(str(int(prediction[0])))
-        self.predicted_price = str(int(prediction[0]))
-        self.update_stats()
+        self.predictedPriceNumberLabel.setText(str(int(prediction['price'])))
+        self.predicted_price = str(int(prediction['price']))
+
+        # Lowest and highest quantile of the tree predictions as the price range,
+        # models without per-tree outputs only give the price
+        if len(prediction) > 1:
+            self.predicted_interval = (int(prediction.iloc[1]), int(prediction.iloc[-1]))
+            self.predictedPriceRangeLabel.setText(
+                f"{prediction.index[1].upper()}-{prediction.index[-1].upper()}: "
+                f"{self.predicted_interval[0]} - {self.predicted_interval[1]}")
+        else:
+            self.predicted_interval = None
+            self.predictedPriceRangeLabel.setText("")
         self.update_plot()
 
+    def on_live_prediction_toggled(self, checked):
+        if checked:
+            self.schedule_live_prediction()
+        else:
+            # Results still in flight belong to the live mode that was just switched off
+            self.live_prediction_timer.stop()
+            self.live_generation += 1
+
+    def schedule_live_prediction(self, *args):
+        # Every input change restarts the debounce timer, only the last change gets scored
+        if self.liveUpdateAction.isChecked() and self.predictor is not None:
+            self.live_prediction_timer.start()
+
+    def start_live_prediction(self):
+        try:
+            input_df = self.collect_input_frame()
+        except ValueError:
+            # Half-typed mileage or engine size, wait for the next change
+            return
+
+        # Tag the job with a new generation so older results can be recognized as stale
+        self.live_generation += 1
+        worker = PredictionWorker(self.predictor, input_df, self.interval_quantiles, self.live_generation)
+        worker.signals.finished.connect(self.on_live_prediction_ready)
+        worker.signals.failed.connect(self.statusBar().showMessage)
+        QThreadPool.globalInstance().start(worker)
+
+    def on_live_prediction_ready(self, result):
+        # Drop results computed for inputs that have changed since
+        if result.generation == self.live_generation:
+            self.show_prediction(result.prediction)
+
     def on_last_variable_button_clicked(self):
         self.current_variable_index -= 1
         if self.current_variable_index < 0:
@@ -1144,18 +1280,13 @@ class UICarPricePredictionDialog(QMainWindow):
         self.update_plot()
 
     def update_plot(self):
+        # Nothing to update until the background loading has created the plot
+        if self.scatter_plot is None:
+            return
+
         selected_variable = self.numeric_columns[self.current_variable_index]
         self.currentVariableResultLabel.setText(selected_variable.capitalize())
 
-        # Update the scatter plot with the selected variable
-        self.scatter_plot.clear()  # Clear the existing plot
-        self.scatter_plot = sns.scatterplot(
-            data=self.random_sample_df,
-            y="price",
-            x=selected_variable,
-            ax=self.scatter_plot
-        )
-
         # Get values from various UI elements
         mileage_value = self.mileageLineEdit.text()
         engine_size_value = self.engineSizeLineEdit.text()
@@ -1168,6 +1299,13 @@ class UICarPricePredictionDialog(QMainWindow):
         if engine_size_value == '':
             engine_size_value = 1
 
+        # Numeric x-coordinates so the marker lands on the numeric axis
+        try:
+            mileage_value = int(mileage_value)
+            engine_size_value = float(engine_size_value)
+        except ValueError:
+            mileage_value, engine_size_value = 0, 1
+
         # Get values from dials and sliders
         mpg_value = self.mpgDial.value()
         tax_value = self.taxDial.value()
@@ -1188,52 +1326,144 @@ class UICarPricePredictionDialog(QMainWindow):
             red_point_x = year_value
 
         # The y-coordinate of the red point
-        red_point_y = self.predicted_price
+        red_point_y = None if self.predicted_price is None else int(self.predicted_price)
 
-        if red_point_y is not None:
-            self.scatter_plot.scatter(
-                red_point_x,
-                int(red_point_y),
-                color='red',
-                marker='x',
-                s=100,
-                label='Highlighted Point')
+        # Show the points of the selected variable and move the red point and its prediction interval,
+        # the existing artists are reused
+        self.scatter_view.show(selected_variable, red_point_x, red_point_y, self.predicted_interval)
 
-        self.scatter_plot.set_title(f"Scatter Plot: Price vs. {selected_variable.capitalize()}")
-        # Customize xlabel and ylabel appearance
-        self.scatter_plot.set_xlabel(selected_variable.capitalize(), fontsize=12, labelpad=5)
-        self.scatter_plot.set_ylabel("Price", fontsize=12, labelpad=5)
-
-        # Redraw the canvas
-        self.scatter_canvas.draw()
+        # Repaint once the event loop is idle, several updates in a row cost a single draw
+        self.scatter_canvas.draw_idle()
 
     def import_csv_file(self):
         file_path, _ = QFileDialog.getOpenFileName(self, "Select CSV file", "", "CSV File (*.csv)")
 
         if file_path:
-            # Read the CSV file into a DataFrame using pandas
-            self.df = pd.read_csv(file_path)
-            print("File chosen and loaded into variable.")
+            print("File chosen, retraining in the background.")
+            self.start_retraining(RetrainWorker(file_path))
+        else:
+            print("No file chosen.")
 
-            # Load the saved random forest model
-            self.update_plot()
-            # Analyze the input DataFrame
-            self.df_analyze = DFAnalyze(self.df).analyze()
-            self.df = DFPreprocess(self.df).preprocess()
-            self.df = self.df.dropna()
-            df_train = DFTrain(self.df)
-            self.random_forest_model = df_train.train_random_forest_regressor()
-            df_train.save_trained_model()
+    def append_csv_file(self):
+        # Appending needs a model to grow, a full import works without one
+        if self.predictor is None:
+            self.statusBar().showMessage('No model loaded yet, use Import CSV File instead')
+            return
+
+        file_path, _ = QFileDialog.getOpenFileName(self, "Select CSV file", "", "CSV File (*.csv)")
+
+        if file_path:
+            print("File chosen, adding trees in the background.")
+            self.start_retraining(AppendTrainWorker(file_path, PipelineResult(self.df, self.predictor)))
         else:
             print("No file chosen.")
 
+    def start_retraining(self, worker):
+        # Analyze, preprocess and train off the UI thread, predictions keep using the old model
+        self.retrain_worker = worker
+        self.retrain_worker.signals.progress.connect(self.on_loading_progress)
+        self.retrain_worker.signals.finished.connect(self.on_retrain_finished)
+        self.retrain_worker.signals.failed.connect(self.on_retrain_stopped)
+        self.retrain_worker.signals.cancelled.connect(self.on_retrain_cancelled)
+
+        self.import_csv_file_action.setEnabled(False)
+        self.append_csv_file_action.setEnabled(False)
+        self.cancel_retraining_action.setEnabled(True)
+        self.loadingProgressBar.show()
+        QThreadPool.globalInstance().start(self.retrain_worker)
+
+    def cancel_retraining(self):
+        if self.retrain_worker is not None:
+            self.retrain_worker.cancel()
+            self.statusBar().showMessage('Cancelling after the current stage...')
+
+    def on_retrain_finished(self, result):
+        # Swap data and model in one step on the UI thread, only after training succeeded
+        self.df = result.df
+        self.predictor = result.predictor
+        self.model_version = result.version
+        self.model_reload_timer.start()
+        self.on_retrain_stopped('Retraining finished, the new model is in use')
+
+        # Live results of the old model are stale now, score the current inputs again
+        self.live_generation += 1
+        self.schedule_live_prediction()
+
+        # The plot does not exist yet when the startup loading failed
+        if self.scatter_plot is None:
+            self.setup_plot()
+        else:
+            self.random_sample_df = self.df.sample(n=min(100, len(self.df)), random_state=42)
+            self.scatter_view.set_data(self.random_sample_df)
+            self.update_plot()
+
+        # Appended rows are added to the statistics, a full retrain replaces the data
+        if result.appended_df is not None and self.cube is not None:
+            self.aggregates.add_rows(result.appended_df)
+            self.cube.add_rows(result.appended_df)
+        else:
+            self.aggregates.reset(self.df)
+            self.cube = AggregateCube.from_frame(self.df)
+        self.update_slice_stats()
+        self.predictPriceButton.setEnabled(True)
+
+    def on_retrain_cancelled(self):
+        self.on_retrain_stopped('Retraining cancelled, the previous model is still in use')
+
+    def on_retrain_stopped(self, message):
+        self.retrain_worker = None
+        self.import_csv_file_action.setEnabled(True)
+        self.append_csv_file_action.setEnabled(True)
+        self.cancel_retraining_action.setEnabled(False)
+        self.loadingProgressBar.hide()
+        self.statusBar().showMessage(message)
+        print(message)
+
+    def check_for_new_model(self):
+        # A retrain publishes and swaps its own model, and without data there is nothing to predict on
+        if self.retrain_worker is not None or self.model_reload_worker is not None or self.df is None:
+            return
+
+        _, version = resolve_model_dir(self.model_dir)
+        if version != self.model_version:
+            self.model_reload_worker = ModelReloadWorker(self.model_dir)
+            self.model_reload_worker.signals.finished.connect(self.on_model_reloaded)
+            self.model_reload_worker.signals.failed.connect(self.on_model_reload_failed)
+            QThreadPool.globalInstance().start(self.model_reload_worker)
+
+    def on_model_reloaded(self, result):
+        self.model_reload_worker = None
+        self.predictor = result.predictor
+        self.model_version = result.version
+        self.statusBar().showMessage(f'Model version {result.version or "default"} loaded')
+
+        # Live results of the old model are stale now
+        self.live_generation += 1
+        self.schedule_live_prediction()
+        self.predictPriceButton.setEnabled(True)
+
+    def on_model_reload_failed(self, message):
+        self.model_reload_worker = None
+        # Remember the version anyway, so a broken bundle is not loaded again every poll
+        _, self.model_version = resolve_model_dir(self.model_dir)
+        self.statusBar().showMessage(message)
+        print(message)
+
+    def rollback_model(self):
+        try:
+            version = ModelRegistry().rollback()
+        except ValueError as error:
+            self.statusBar().showMessage(str(error))
+            return
+
+        self.statusBar().showMessage(f'Rolling back to model version {version}...')
+        self.check_for_new_model()
 
 # The following block initializes the application, creates a dialog, sets up the UI,
 # and finally, shows the dialog.
 def main():
-    df = pd.read_csv('csv/cars.csv')
     app = QApplication(sys.argv)
-    ui = UICarPricePredictionDialog(df)
+    ui = UICarPricePredictionDialog('csv/cars.csv')
     ui.show()
     sys.exit(app.exec())
 
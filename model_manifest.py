@@ -0,0 +1,53 @@
+import json
+import os
+
+from compiled_forest import CompiledForest
+
+MANIFEST_FILENAME = 'model_manifest.json'
+
+# Estimator backend -> file name of its joblib artifact
+BACKEND_FILENAMES = {
+    'random_forest': 'random_forest_regressor_model.joblib',
+    'hist_gradient_boosting': 'hist_gradient_boosting_regressor_model.joblib'
+}
+
+
+def write_manifest(model_dir, backend, model_file, model_format='sklearn', compress=0, float32=False,
+                   prune_depth=None):
+    # model_format is 'sklearn' for a pickled estimator or 'compiled_forest' for the node arrays
+    manifest = {
+        'backend': backend,
+        'model_file': model_file,
+        'format': model_format,
+        'compress': compress,
+        'float32': float32,
+        'prune_depth': prune_depth
+    }
+    with open(f'{model_dir}/{MANIFEST_FILENAME}', 'w') as file:
+        json.dump(manifest, file, indent=2)
+
+
+def read_manifest(model_dir):
+    # Model directories from before the manifest only ever held a random forest,
+    # either compiled or pickled by sklearn
+    path = f'{model_dir}/{MANIFEST_FILENAME}'
+    if not os.path.exists(path):
+        if os.path.exists(f'{model_dir}/{CompiledForest.FILENAME}'):
+            model_file, model_format = CompiledForest.FILENAME, 'compiled_forest'
+        else:
+            model_file, model_format = BACKEND_FILENAMES['random_forest'], 'sklearn'
+        return {
+            'backend': 'random_forest',
+            'model_file': model_file,
+            'format': model_format,
+            'compress': 0
+        }
+
+    with open(path) as file:
+        manifest = json.load(file)
+    # Manifests written before the artifact options only hold pickled estimators
+    manifest.setdefault('format', 'sklearn')
+    manifest.setdefault('compress', 0)
+    if manifest['backend'] not in BACKEND_FILENAMES:
+        raise ValueError(f"Unknown model backend {manifest['backend']} in {path}")
+    return manifest
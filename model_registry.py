@@ -0,0 +1,183 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+import text_format
+from model_manifest import MANIFEST_FILENAME
+
+text_format = text_format.TextFormat
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    DIRECTORY = 'model_registry'
+    POINTER_FILENAME = 'CURRENT'
+
+    def __init__(self, directory=DIRECTORY, keep_versions=10):
+        self.directory = directory
+        self.keep_versions = keep_versions
+        os.makedirs(self.directory, exist_ok=True)
+
+    def versions(self):
+        # Published versions are the directories named v0001, v0002, ... in publish order
+        return sorted(name for name in os.listdir(self.directory)
+                      if name.startswith('v') and os.path.isdir(f'{self.directory}/{name}'))
+
+    def current_version(self):
+        try:
+            with open(f'{self.directory}/{self.POINTER_FILENAME}') as file:
+                return file.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def version_dir(self, version):
+        return f'{self.directory}/{version}'
+
+    def create_staging_dir(self):
+        # Training writes its complete bundle here, readers never look into staging directories
+        staging_dir = f'{self.directory}/.staging-{uuid.uuid4().hex}'
+        os.makedirs(staging_dir)
+        return staging_dir
+
+    def discard_staging_dir(self, staging_dir):
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def publish(self, staging_dir, metrics=None):
+        # Record checksums of every file of the bundle and the training metrics in its manifest
+        manifest_path = f'{staging_dir}/{MANIFEST_FILENAME}'
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+        manifest['checksums'] = {name: file_checksum(f'{staging_dir}/{name}')
+                                 for name in sorted(os.listdir(staging_dir)) if name != MANIFEST_FILENAME}
+        manifest['metrics'] = metrics
+        manifest['created'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        with open(manifest_path, 'w') as file:
+            json.dump(manifest, file, indent=2)
+
+        # Renaming a directory is atomic, the version appears complete or not at all.
+        # A concurrent publisher that took the same number makes the rename fail, then try the next one
+        while True:
+            versions = self.versions()
+            number = int(versions[-1][1:]) + 1 if versions else 1
+            version = f'v{number:04d}'
+            try:
+                os.rename(staging_dir, self.version_dir(version))
+                break
+            except OSError:
+                if not os.path.exists(self.version_dir(version)):
+                    raise
+
+        self.set_current(version)
+        self.remove_old_versions()
+        print(f'Model version {version} published to {self.version_dir(version)}')
+        return version
+
+    def publish_bundle(self, df_preprocess, df_train):
+        # Write transform, model and manifest of a training run into a fresh directory and publish it
+        # in one step, a failed save leaves the current version untouched
+        staging_dir = self.create_staging_dir()
+        try:
+            df_preprocess.save_feature_transform(staging_dir)
+            df_train.save_trained_model(model_dir=staging_dir)
+            return self.publish(staging_dir, df_train.metrics.to_dict())
+        except Exception:
+            self.discard_staging_dir(staging_dir)
+            raise
+
+    def set_current(self, version):
+        # Write the new pointer next to the old one and swap it in with a single atomic replace,
+        # readers see either the old or the new version, never a partial file
+        temporary_path = f'{self.directory}/{self.POINTER_FILENAME}.{uuid.uuid4().hex}.tmp'
+        with open(temporary_path, 'w') as file:
+            file.write(version)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary_path, f'{self.directory}/{self.POINTER_FILENAME}')
+
+    def verify(self, version):
+        with open(f'{self.version_dir(version)}/{MANIFEST_FILENAME}') as file:
+            checksums = json.load(file).get('checksums', {})
+        for name, checksum in checksums.items():
+            if file_checksum(f'{self.version_dir(version)}/{name}') != checksum:
+                raise ValueError(f'{self.version_dir(version)}/{name} does not match its checksum')
+
+    def activate(self, version):
+        if version not in self.versions():
+            raise ValueError(f'Unknown model version {version}')
+        self.verify(version)
+        self.set_current(version)
+        print(f'Model version {version} is now current')
+
+    def rollback(self):
+        # Point back to the version published before the current one
+        versions = self.versions()
+        current = self.current_version()
+        if current not in versions or versions.index(current) == 0:
+            raise ValueError('There is no earlier model version to roll back to')
+        previous = versions[versions.index(current) - 1]
+        self.activate(previous)
+        return previous
+
+    def remove_old_versions(self):
+        # Keep the newest versions plus whatever the pointer refers to
+        current = self.current_version()
+        for version in self.versions()[:-self.keep_versions]:
+            if version != current:
+                shutil.rmtree(self.version_dir(version), ignore_errors=True)
+
+
+def resolve_model_dir(default_dir='default_model', registry_dir=ModelRegistry.DIRECTORY):
+    # The current registry version when one has been published, otherwise the bundled default model.
+    # Returns the directory and the version name, which is None for the default model
+    if os.path.isdir(registry_dir):
+        version = ModelRegistry(registry_dir).current_version()
+        if version is not None:
+            return f'{registry_dir}/{version}', version
+    return default_dir, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the published model versions')
+    parser.add_argument('--registry', default=ModelRegistry.DIRECTORY, help='registry directory')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help='list the versions and mark the current one')
+    subparsers.add_parser('rollback', help='make the version before the current one current again')
+    activate_parser = subparsers.add_parser('activate', help='make the given version current')
+    activate_parser.add_argument('version')
+    verify_parser = subparsers.add_parser('verify', help='check the files of a version against their checksums')
+    verify_parser.add_argument('version')
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.registry)
+    if args.command == 'list':
+        current = registry.current_version()
+        print(f"\n{text_format.BOLD}Model versions in {args.registry}{text_format.RESET}\n")
+        for version in registry.versions():
+            with open(f'{registry.version_dir(version)}/{MANIFEST_FILENAME}') as file:
+                manifest = json.load(file)
+            metrics = manifest.get('metrics') or {}
+            marker = '*' if version == current else ' '
+            print(f"{marker} {version}  {manifest.get('created', '')}  {manifest['backend']:<24} "
+                  f"R2 {metrics.get('r2', float('nan')):.4f}")
+    elif args.command == 'rollback':
+        registry.rollback()
+    elif args.command == 'activate':
+        registry.activate(args.version)
+    else:
+        registry.verify(args.version)
+        print(f'Model version {args.version} matches its checksums')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+import argparse
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from df_predict import DFPredict
+from features import FeatureColumns
+from model_registry import resolve_model_dir
+
+
+class PendingRequest:
+    def __init__(self, df):
+        self.df = df
+        self.done = threading.Event()
+        self.predictions = None
+        self.error = None
+
+
+class PredictionBatcher:
+    # Seconds a request waits for its batch before the handler gives up on it
+    REQUEST_TIMEOUT = 30.0
+
+    def __init__(self, predictor, window_ms=5.0, max_batch_rows=1024):
+        self.predictor = predictor
+        self.window = window_ms / 1000
+        self.max_batch_rows = max_batch_rows
+        self.queue = queue.Queue()
+
+        # Counters reported by /metrics
+        self.metrics_lock = threading.Lock()
+        self.requests = 0
+        self.rows = 0
+        self.batches = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+
+        self.worker = threading.Thread(target=self.run, daemon=True)
+        self.worker.start()
+
+    def submit(self, df):
+        # Called from the HTTP handler threads, blocks until the merged batch is scored
+        pending = PendingRequest(df)
+        self.queue.put(pending)
+        if not pending.done.wait(self.REQUEST_TIMEOUT):
+            raise TimeoutError(f'No prediction within {self.REQUEST_TIMEOUT:g} seconds')
+        if pending.error is not None:
+            raise pending.error
+        return pending.predictions
+
+    def run(self):
+        while True:
+            # Wait for the first request, then collect whatever arrives within the window
+            batch = [self.queue.get()]
+            rows = len(batch[0].df)
+            deadline = time.monotonic() + self.window
+            while rows < self.max_batch_rows:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    pending = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(pending)
+                rows += len(pending.df)
+
+            self.predict_batch(batch, rows)
+
+    def predict_batch(self, batch, rows):
+        # The whole batch is scored by one model, even if a reload swaps it in the meantime
+        predictor = self.predictor
+        try:
+            try:
+                # One vectorized forest call for all merged requests
+                df = pd.concat([pending.df for pending in batch], ignore_index=True)
+                predictions = predictor.predict_frame(df)
+                start = 0
+                for pending in batch:
+                    pending.predictions = predictions[start:start + len(pending.df)]
+                    start += len(pending.df)
+            except Exception:
+                # A single bad request must not fail the others, so score them one by one
+                for pending in batch:
+                    try:
+                        pending.predictions = predictor.predict_frame(pending.df)
+                    except Exception as error:
+                        pending.error = error
+
+            with self.metrics_lock:
+                self.requests += len(batch)
+                self.rows += rows
+                self.batches += 1
+                self.last_batch_size = len(batch)
+                self.max_batch_size = max(self.max_batch_size, len(batch))
+        finally:
+            # Whatever happened above, no handler thread may wait forever and the worker keeps running
+            for pending in batch:
+                pending.done.set()
+
+    def metrics(self):
+        with self.metrics_lock:
+            return {
+                'queue_depth': self.queue.qsize(),
+                'requests': self.requests,
+                'rows': self.rows,
+                'batches': self.batches,
+                'avg_batch_size': self.requests / self.batches if self.batches else 0.0,
+                'last_batch_size': self.last_batch_size,
+                'max_batch_size': self.max_batch_size
+            }
+
+
+class ModelReloader:
+    def __init__(self, batcher, model_dir, version, interval=2.0):
+        self.batcher = batcher
+        self.model_dir = model_dir
+        self.version = version
+        self.interval = interval
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        # Poll the registry pointer and swap in a newly published or rolled back version,
+        # requests keep being served by the old model while the new one loads
+        while True:
+            time.sleep(self.interval)
+            model_dir, version = resolve_model_dir(self.model_dir)
+            if version == self.version:
+                continue
+            try:
+                self.batcher.predictor = DFPredict.load(model_dir)
+                print(f'Model version {version or "default"} loaded from {model_dir}')
+            except Exception as error:
+                print(f'Model reload from {model_dir} failed: {error}')
+            self.version = version
+
+
+class PredictHTTPServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connections under concurrent load
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class PredictRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/metrics':
+            self.send_json(200, self.server.batcher.metrics())
+        else:
+            self.send_json(404, {'error': f'Unknown path {self.path}'})
+
+    def do_POST(self):
+        if self.path not in ('/predict', '/predict/batch'):
+            self.send_json(404, {'error': f'Unknown path {self.path}'})
+            return
+
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            cars = [body] if self.path == '/predict' else body
+            if not isinstance(cars, list) or not all(isinstance(car, dict) for car in cars):
+                raise ValueError('Expected a JSON object per car')
+            for car in cars:
+                for feature in FeatureColumns.FEATURES:
+                    if isinstance(car.get(feature), (list, dict)):
+                        raise ValueError(f'{feature} must be a single value')
+            df = pd.DataFrame(cars)[FeatureColumns.FEATURES]
+            if df.isnull().any(axis=None):
+                raise ValueError('Every car needs a value for each of ' + ', '.join(FeatureColumns.FEATURES))
+            predictions = self.server.batcher.submit(df)
+        except (KeyError, ValueError, TypeError) as error:
+            self.send_json(400, {'error': str(error)})
+            return
+        except TimeoutError as error:
+            self.send_json(503, {'error': str(error)})
+            return
+        except Exception as error:
+            self.send_json(500, {'error': str(error)})
+            return
+
+        if self.path == '/predict':
+            self.send_json(200, {'price': float(predictions[0])})
+        else:
+            self.send_json(200, {'prices': [float(price) for price in predictions]})
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Keep the console quiet under load
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HTTP/JSON car price prediction service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--model-dir', default='default_model',
+                        help='model used until a version is published to the model registry')
+    parser.add_argument('--batch-window-ms', type=float, default=5.0,
+                        help='how long to wait for more requests to merge into one batch')
+    parser.add_argument('--max-batch-rows', type=int, default=1024)
+    parser.add_argument('--reload-interval', type=float, default=2.0,
+                        help='seconds between checks of the model registry for a new current version')
+    args = parser.parse_args()
+
+    # Load the artifacts once, every request shares them
+    model_dir, version = resolve_model_dir(args.model_dir)
+    predictor = DFPredict.load(model_dir)
+
+    server = PredictHTTPServer((args.host, args.port), PredictRequestHandler)
+    server.batcher = PredictionBatcher(predictor, args.batch_window_ms, args.max_batch_rows)
+    server.reloader = ModelReloader(server.batcher, args.model_dir, version, args.reload_interval)
+    print(f'Serving predictions on http://{args.host}:{args.port}')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
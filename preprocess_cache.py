@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from feature_transform import FeatureTransform
+from features import FeatureColumns
+
+
+class PreprocessCache:
+    DIRECTORY = 'cache/preprocess'
+
+    def __init__(self, directory=DIRECTORY, max_bytes=256 * 1024 ** 2):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(csv_path, params):
+        # Content address: hash of the file bytes plus the preprocessing parameters,
+        # so a renamed copy hits and a changed parameter misses
+        digest = hashlib.sha256()
+        with open(csv_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                digest.update(chunk)
+        digest.update(json.dumps(params, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def path(self, key):
+        return f'{self.directory}/{key}.npz'
+
+    def get(self, key):
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+
+        # Plain arrays only, nothing is unpickled from the cache directory
+        with np.load(path) as entry:
+            x = entry['x']
+            y = entry['y']
+            categories = {column: entry[f'categories_{column}'].tolist() for column in FeatureColumns.CATEGORICAL}
+            feature_transform = FeatureTransform(categories, entry['scale'], entry['min'])
+
+        # Mark the entry as recently used for the eviction order
+        os.utime(path)
+        return x, y, feature_transform
+
+    def put(self, key, x, y, feature_transform):
+        arrays = {
+            'x': x,
+            'y': y,
+            'scale': feature_transform.scale,
+            'min': feature_transform.min
+        }
+        for column in FeatureColumns.CATEGORICAL:
+            arrays[f'categories_{column}'] = np.array(feature_transform.categories[column], dtype=str)
+
+        # Write to a temporary file first so a crash never leaves a half-written entry behind
+        temporary_path = f'{self.directory}/{key}.tmp.npz'
+        np.savez(temporary_path, **arrays)
+        os.replace(temporary_path, self.path(key))
+
+        self.evict()
+
+    def evict(self):
+        # Drop the least recently used entries until the directory fits into max_bytes
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.npz') and not name.endswith('.tmp.npz'):
+                stat = os.stat(f'{self.directory}/{name}')
+                entries.append((stat.st_mtime, stat.st_size, name))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries[:-1]:
+            if total <= self.max_bytes:
+                break
+            os.remove(f'{self.directory}/{name}')
+            total -= size
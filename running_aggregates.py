@@ -0,0 +1,77 @@
+from collections import Counter
+
+
+class RunningAggregates:
+    # Columns whose average is shown in the statistics panel
+    AVERAGE_COLUMNS = ['mileage', 'mpg']
+
+    def __init__(self):
+        # Non-null count and sum per averaged column, and the number of rows per model
+        self.counts = {column: 0 for column in self.AVERAGE_COLUMNS}
+        self.sums = {column: 0.0 for column in self.AVERAGE_COLUMNS}
+        self.model_counts = Counter()
+
+        # Values as last shown, listeners hear only about values that differ from these
+        self.values = {}
+        self.listeners = []
+
+    def subscribe(self, listener):
+        # listener(name, value) is called with 'top_model', 'average_mileage' or 'average_mpg'
+        self.listeners.append(listener)
+
+    def reset(self, df):
+        # Recount from scratch, for a frame that replaces the old data completely
+        self.counts = {column: 0 for column in self.AVERAGE_COLUMNS}
+        self.sums = {column: 0.0 for column in self.AVERAGE_COLUMNS}
+        self.model_counts = Counter()
+        self.add_rows(df)
+
+    @staticmethod
+    def model_frequencies(df):
+        # A categorical column also lists the models without rows, leave those out
+        frequencies = df['model'].value_counts()
+        return frequencies[frequencies > 0].to_dict()
+
+    def add_rows(self, df):
+        # Cost depends on the new rows only, one vectorized sum and count per column
+        for column in self.AVERAGE_COLUMNS:
+            self.counts[column] += int(df[column].count())
+            self.sums[column] += float(df[column].sum())
+        self.model_counts.update(self.model_frequencies(df))
+        self.refresh()
+
+    def remove_rows(self, df):
+        for column in self.AVERAGE_COLUMNS:
+            self.counts[column] -= int(df[column].count())
+            self.sums[column] -= float(df[column].sum())
+        self.model_counts.subtract(self.model_frequencies(df))
+        # Counter.subtract keeps models at zero, drop them so they cannot be the top model
+        self.model_counts = +self.model_counts
+        self.refresh()
+
+    def average(self, column):
+        if self.counts[column] == 0:
+            return None
+        return self.sums[column] / self.counts[column]
+
+    def top_model(self):
+        if not self.model_counts:
+            return None
+        return self.model_counts.most_common(1)[0][0]
+
+    def snapshot(self):
+        # The values as the labels show them, averages are cut to whole numbers
+        average_mileage = self.average('mileage')
+        average_mpg = self.average('mpg')
+        return {
+            'top_model': self.top_model(),
+            'average_mileage': None if average_mileage is None else int(average_mileage),
+            'average_mpg': None if average_mpg is None else int(average_mpg)
+        }
+
+    def refresh(self):
+        for name, value in self.snapshot().items():
+            if name not in self.values or self.values[name] != value:
+                self.values[name] = value
+                for listener in self.listeners:
+                    listener(name, value)
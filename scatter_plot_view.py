@@ -0,0 +1,71 @@
+import numpy as np
+
+
+class ScatterPlotView:
+    # Look of the seaborn scatter plot this view replaces
+    POINT_STYLE = {'s': 36, 'color': '#1f77b4', 'edgecolors': 'white', 'linewidths': 0.75}
+    # Share of the data range added on each side, the matplotlib default margin
+    MARGIN = 0.05
+
+    def __init__(self, ax, df, variables):
+        # All artists are created once: one point collection per variable against the price, of which
+        # only the selected one is visible, and one marker plus one interval line for the prediction
+        self.ax = ax
+        self.variables = list(variables)
+        self.collections = {variable: ax.scatter([], [], visible=False, **self.POINT_STYLE)
+                            for variable in self.variables}
+        self.marker, = ax.plot([], [], color='red', marker='x', markersize=10, linestyle='', visible=False)
+        self.interval_line, = ax.plot([], [], color='red', linewidth=2, alpha=0.6, visible=False)
+        self.ax.set_ylabel("Price", fontsize=12, labelpad=5)
+
+        # Limits are set explicitly on every update, autoscaling would look at the hidden collections too
+        self.ax.set_autoscale_on(False)
+        self.bounds = {}
+        self.variable = None
+        self.set_data(df)
+
+    def set_data(self, df):
+        # Swap the points of every collection, e.g. for the sample of newly imported data
+        price = df['price'].to_numpy(dtype=np.float64)
+        for variable, collection in self.collections.items():
+            x = df[variable].to_numpy(dtype=np.float64)
+            collection.set_offsets(np.column_stack([x, price]))
+            if len(price):
+                self.bounds[variable] = (np.nanmin(x), np.nanmax(x), np.nanmin(price), np.nanmax(price))
+            else:
+                self.bounds[variable] = (0.0, 1.0, 0.0, 1.0)
+
+    def show(self, variable, marker_x=None, marker_y=None, interval=None):
+        # Only visibility, marker data, limits and, on a variable switch, the texts change
+        if variable != self.variable:
+            if self.variable is not None:
+                self.collections[self.variable].set_visible(False)
+            self.collections[variable].set_visible(True)
+            self.ax.set_title(f"Scatter Plot: Price vs. {variable.capitalize()}")
+            self.ax.set_xlabel(variable.capitalize(), fontsize=12, labelpad=5)
+            self.variable = variable
+
+        x_min, x_max, y_min, y_max = self.bounds[variable]
+        if marker_y is None:
+            self.marker.set_visible(False)
+            self.interval_line.set_visible(False)
+        else:
+            self.marker.set_data([marker_x], [marker_y])
+            self.marker.set_visible(True)
+            x_min, x_max = min(x_min, marker_x), max(x_max, marker_x)
+            y_min, y_max = min(y_min, marker_y), max(y_max, marker_y)
+
+            if interval is None:
+                self.interval_line.set_visible(False)
+            else:
+                self.interval_line.set_data([marker_x, marker_x], list(interval))
+                self.interval_line.set_visible(True)
+                y_min, y_max = min(y_min, interval[0]), max(y_max, interval[1])
+
+        self.ax.set_xlim(*self.padded(x_min, x_max))
+        self.ax.set_ylim(*self.padded(y_min, y_max))
+
+    def padded(self, low, high):
+        # A single distinct value still gets a visible range around it
+        margin = (high - low) * self.MARGIN or max(abs(low) * self.MARGIN, 1.0)
+        return low - margin, high + margin
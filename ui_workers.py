@@ -0,0 +1,270 @@
+import os
+import threading
+
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+
+class WorkerSignals(QObject):
+    # Current stage description and overall percentage
+    progress = pyqtSignal(str, int)
+    # Result object of the finished job
+    finished = pyqtSignal(object)
+    # Error message when the job failed
+    failed = pyqtSignal(str)
+    # The job stopped because cancel() was called
+    cancelled = pyqtSignal()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class PipelineResult:
+    def __init__(self, df, predictor, version=None, appended_df=None):
+        # Outlier-filtered raw rows for the plot and statistics, the predictor to use
+        # and its model registry version, None for the bundled default model.
+        # appended_df holds the rows an append added to the previous data
+        self.df = df
+        self.predictor = predictor
+        self.version = version
+        self.appended_df = appended_df
+
+
+class StartupWorker(QRunnable):
+    def __init__(self, csv_path, model_dir):
+        super().__init__()
+        self.csv_path = csv_path
+        self.model_dir = model_dir
+        self.signals = WorkerSignals()
+
+    def run(self):
+        # Imported here so pandas and sklearn load off the UI thread, after the window is shown
+        from df_analyze import DFAnalyze
+        from df_load import DFLoad
+        from df_predict import DFPredict
+        from df_preprocess import DFPreprocess
+        from model_registry import resolve_model_dir
+
+        try:
+            self.signals.progress.emit('Loading CSV file...', 10)
+            df = DFLoad(self.csv_path).load()
+
+            # Analyze the input DataFrame, the full report is cached under cache/analysis/
+            self.signals.progress.emit('Analyzing data...', 30)
+            print(f'Analyzed {self.csv_path}: {DFAnalyze(df).analyze()}')
+
+            # Preprocess the input DataFrame by removing outliers
+            self.signals.progress.emit('Removing outliers...', 60)
+            df = DFPreprocess(df).remove_outliers()
+
+            # Load the current registry version, or the bundled model before the first retrain
+            self.signals.progress.emit('Loading model...', 80)
+            model_dir, version = resolve_model_dir(self.model_dir)
+            predictor = DFPredict.load(model_dir)
+        except Exception as error:
+            # Anything raised here would otherwise be lost in the thread pool
+            self.signals.failed.emit(f'Startup failed: {error}')
+            return
+
+        self.signals.progress.emit('Ready', 100)
+        self.signals.finished.emit(PipelineResult(df, predictor, version))
+
+
+class ModelReloadWorker(QRunnable):
+    def __init__(self, model_dir):
+        super().__init__()
+        self.model_dir = model_dir
+        self.signals = WorkerSignals()
+
+    def run(self):
+        from df_predict import DFPredict
+        from model_registry import resolve_model_dir
+
+        try:
+            model_dir, version = resolve_model_dir(self.model_dir)
+            predictor = DFPredict.load(model_dir)
+        except Exception as error:
+            self.signals.failed.emit(f'Model reload failed: {error}')
+            return
+
+        # Only the predictor changes, the data shown in the window stays
+        self.signals.finished.emit(PipelineResult(None, predictor, version))
+
+
+class RetrainWorker(QRunnable):
+    # CSV files above this size take the chunked path instead of being read whole
+    STREAM_BYTES = 512 * 1024 ** 2
+    STREAM_DIRECTORY = 'cache/stream'
+    STREAM_SAMPLE_ROWS = 1_000_000
+
+    def __init__(self, csv_path):
+        super().__init__()
+        self.csv_path = csv_path
+        self.signals = WorkerSignals()
+        self.cancel_requested = threading.Event()
+
+    def cancel(self):
+        # Honoured at the next stage boundary or after the next batch of trees
+        self.cancel_requested.set()
+
+    def enter_stage(self, stage, percent):
+        if self.cancel_requested.is_set():
+            raise JobCancelled()
+        self.signals.progress.emit(stage, percent)
+
+    def on_training_progress(self, trees_done, n_estimators):
+        # Training takes the 45-90% part of the progress bar
+        self.enter_stage(f'Training model... {trees_done}/{n_estimators} trees', 45 + 45 * trees_done // n_estimators)
+
+    def run(self):
+        from df_analyze import DFAnalyze
+        from df_load import DFLoad
+        from df_predict import DFPredict
+        from df_preprocess import DFPreprocess
+        from df_train import DFTrain
+        from model_registry import ModelRegistry
+        from preprocess_cache import PreprocessCache
+
+        try:
+            if os.path.getsize(self.csv_path) > self.STREAM_BYTES:
+                self.run_streaming()
+                return
+
+            # Read the CSV file into a DataFrame using pandas
+            self.enter_stage('Loading CSV file...', 5)
+            df = DFLoad(self.csv_path).load()
+
+            # Analyze the input DataFrame, the full report is cached under cache/analysis/
+            self.enter_stage('Analyzing data...', 15)
+            print(f'Analyzed {self.csv_path}: {DFAnalyze(df).analyze()}')
+
+            # Remove outliers, the filtered raw rows are kept for the plot and the statistics
+            self.enter_stage('Preprocessing data...', 30)
+            df_preprocess = DFPreprocess(df)
+            filtered_df = df_preprocess.remove_outliers().copy()
+            cache_key = PreprocessCache.key(self.csv_path, df_preprocess.cache_params())
+            train_df = df_preprocess.fit_transform_cached(PreprocessCache(), cache_key).dropna()
+
+            self.enter_stage('Training model...', 45)
+            df_train = DFTrain(train_df)
+            model = df_train.train_random_forest_regressor(progress=self.on_training_progress)
+
+            # Nothing is written to disk before training has succeeded
+            self.enter_stage('Saving model...', 90)
+            version = ModelRegistry().publish_bundle(df_preprocess, df_train)
+        except JobCancelled:
+            self.signals.cancelled.emit()
+            return
+        except Exception as error:
+            self.signals.failed.emit(f'Retraining failed: {error}')
+            return
+
+        self.signals.progress.emit('Retraining finished', 100)
+        predictor = DFPredict(model, df_preprocess.feature_transform)
+        self.signals.finished.emit(PipelineResult(filtered_df, predictor, version))
+
+    def on_stream_progress(self, stage, fraction):
+        # Scanning and encoding take the 5-45% part of the progress bar, the scan has no known total
+        self.enter_stage(stage, 5 if fraction is None else 5 + int(40 * fraction))
+
+    def run_streaming(self):
+        # Files too large for memory are read in chunks into a memory-mapped matrix,
+        # the forest is trained on a bounded random sample of its rows
+        from df_predict import DFPredict
+        from df_stream import DFStreamPreprocess
+        from df_train import DFTrain
+        from model_registry import ModelRegistry
+
+        df_stream = DFStreamPreprocess(self.csv_path, self.STREAM_DIRECTORY)
+        x, y = df_stream.run(self.on_stream_progress)
+
+        self.enter_stage('Training model...', 45)
+        df_train = DFTrain.from_arrays(x, y, self.STREAM_SAMPLE_ROWS)
+        model = df_train.train_random_forest_regressor(progress=self.on_training_progress)
+
+        self.enter_stage('Saving model...', 90)
+        version = ModelRegistry().publish_bundle(df_stream, df_train)
+
+        self.signals.progress.emit('Retraining finished', 100)
+        predictor = DFPredict(model, df_stream.feature_transform)
+        self.signals.finished.emit(PipelineResult(df_stream.filtered_sample(), predictor, version))
+
+
+class AppendTrainWorker(RetrainWorker):
+    def __init__(self, csv_path, current, n_new_trees=20, max_trees=200):
+        super().__init__(csv_path)
+        # PipelineResult of the data and predictor in use, the new rows are added on top of them
+        self.current = current
+        self.n_new_trees = n_new_trees
+        self.max_trees = max_trees
+
+    def run(self):
+        import pandas as pd
+        from df_load import DFLoad
+        from df_predict import DFPredict
+        from df_preprocess import DFPreprocess
+        from df_train import DFTrain
+        from model_registry import ModelRegistry
+
+        try:
+            if not hasattr(self.current.predictor.model, 'estimators_'):
+                raise ValueError('the model in use is not a scikit-learn forest, import a full CSV file instead')
+
+            self.enter_stage('Loading CSV file...', 5)
+            df = DFLoad(self.csv_path).load()
+
+            # Only the new rows are preprocessed, with the encoders and scalers of the model in use
+            self.enter_stage('Preprocessing new rows...', 20)
+            df_preprocess = DFPreprocess(df)
+            filtered_df = df_preprocess.remove_outliers().copy()
+            train_df = df_preprocess.transform(self.current.predictor.feature_transform).dropna()
+            if len(train_df) < 2:
+                raise ValueError('the file has no usable rows')
+
+            self.enter_stage('Adding trees...', 45)
+            df_train = DFTrain(train_df)
+            model = df_train.append_random_forest_trees(
+                self.current.predictor.model,
+                n_new_trees=self.n_new_trees,
+                max_trees=self.max_trees,
+                progress=self.on_training_progress
+            )
+
+            self.enter_stage('Saving model...', 90)
+            version = ModelRegistry().publish_bundle(df_preprocess, df_train)
+        except JobCancelled:
+            self.signals.cancelled.emit()
+            return
+        except Exception as error:
+            self.signals.failed.emit(f'Appending failed: {error}')
+            return
+
+        self.signals.progress.emit('Appending finished', 100)
+        df = pd.concat([self.current.df, filtered_df], ignore_index=True)
+        predictor = DFPredict(model, df_preprocess.feature_transform)
+        self.signals.finished.emit(PipelineResult(df, predictor, version, filtered_df))
+
+
+class LivePrediction:
+    def __init__(self, generation, prediction):
+        self.generation = generation
+        self.prediction = prediction
+
+
+class PredictionWorker(QRunnable):
+    def __init__(self, predictor, input_df, quantiles, generation):
+        super().__init__()
+        self.predictor = predictor
+        self.input_df = input_df
+        self.quantiles = quantiles
+        self.generation = generation
+        self.signals = WorkerSignals()
+
+    def run(self):
+        try:
+            prediction = self.predictor.predict_price_frame(self.input_df, self.quantiles, use_cache=True).iloc[0]
+        except (KeyError, ValueError) as error:
+            self.signals.failed.emit(f'Prediction failed: {error}')
+            return
+
+        self.signals.finished.emit(LivePrediction(self.generation, prediction))